@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+WEB_DIR = os.path.join(BENCHMARKS_DIR, "..", "web")
+APP_PATH = os.path.join(WEB_DIR, "streamlit.py")
+# Al final de sys.path: web/streamlit.py no debe ocultar el paquete streamlit
+if WEB_DIR not in sys.path:
+    sys.path.append(WEB_DIR)
+
+# Utilidades para ejecutar la aplicación con el AppTest de Streamlit (sin navegador) en los
+# benchmarks y en las pruebas de carga.
+#
+# AppTest no permite subir ficheros, así que el script envuelve st.file_uploader: si la
+# sesión tiene un fichero preparado (bench_uploads[tipo] = (nombre, bytes, id)) lo devuelve.
+# El fichero se busca en la sesión que ejecuta el script.
+APP_SCRIPT = """
+import io
+import runpy
+
+import streamlit as st
+
+
+class _Upload(io.BytesIO):
+    def __init__(self, name, data, file_id):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+        self.file_id = file_id
+        self.type = ""
+
+
+if not getattr(st.file_uploader, "bench_wrapper", False):
+    _file_uploader = st.file_uploader
+
+    def _bench_file_uploader(label, type=None, *args, **kwargs):
+        uploads = st.session_state.get("bench_uploads", {})
+        for kind in [type] if isinstance(type, str) else list(type or []):
+            if kind in uploads:
+                return _Upload(*uploads[kind])
+        return _file_uploader(label, type, *args, **kwargs)
+
+    _bench_file_uploader.bench_wrapper = True
+    st.file_uploader = _bench_file_uploader
+
+runpy.run_path(APP_PATH, run_name="__main__")
+""".replace("APP_PATH", repr(APP_PATH))
+
+# Evidencias por página en la vista paginada (el primer valor de EVIDENCE_PAGE_SIZES)
+PAGE_SIZE = 10
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Bases de datos, caché y prompts.json en un directorio temporal. Debe llamarse antes de
+# importar los módulos de la aplicación, que leen la configuración al importarse.
+def isolate(prefix="solar-bench-"):
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    os.environ["SOLAR_JOBS_DB"] = os.path.join(workdir, "jobs.db")
+    os.environ["SOLAR_VOTES_DB"] = os.path.join(workdir, "votes.db")
+    os.environ["SOLAR_CACHE_DIR"] = os.path.join(workdir, "cache")
+    # La página principal lee prompts.json del directorio de trabajo
+    os.chdir(workdir)
+    with open("prompts.json", "w") as f:
+        json.dump({}, f)
+    return workdir
+
+
+def upload(name, data):
+    return name, data, hashlib.sha256(data).hexdigest()
+
+
+# Clave del botón de voto de una evidencia en la vista paginada (ver render_evidence)
+def vote_key(digest, analysis_idx, evidence_idx, direction="up"):
+    return f"doc_{digest[:12]}_vote_{analysis_idx}_{evidence_idx}_{direction}"
+
+
+def check(at):
+    if at.exception:
+        raise RuntimeError(f"The app raised an exception: {at.exception[0].message}")
+    for error in at.error:
+        raise RuntimeError(f"The app showed an error: {error.value}")
+    return at
+
+
+# AppTest no admite varias ejecuciones a la vez en un proceso (cada una instala y después
+# borra un Runtime global): en cada proceso se ejecuta una sola sesión cada vez
+def new_app(timeout, page, uploads):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_string(APP_SCRIPT, default_timeout=timeout)
+    at.session_state["page"] = page
+    at.session_state["bench_uploads"] = uploads
+    return at
+
+
+# Cada cuánto se vuelve a ejecutar la página mientras hay un análisis en curso (AppTest no
+# ejecuta los fragmentos con run_every por sí solo). Los benchmarks, con una sola sesión,
+# consultan más a menudo que la aplicación para medir la latencia con precisión; la prueba de
+# carga usa el intervalo de la aplicación (jobs.POLL_SECONDS).
+POLL_SECONDS = 0.05
+
+
+# Pulsar "Submit" en la página principal y esperar a que se muestre el resultado
+def submit(at, poll_seconds=POLL_SECONDS):
+    next(button for button in at.button if button.label == "Submit").click()
+    check(at.run())
+    while any(info.value.startswith("Analyzing your paper") for info in at.info):
+        time.sleep(poll_seconds)
+        check(at.run())
+    return at
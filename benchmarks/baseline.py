@@ -0,0 +1,122 @@
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+
+# Resultados de los benchmarks en un formato estable (JSON) para guardarlos como referencia
+# y compararlos entre versiones.
+
+
+class Results:
+    """Tiempos medidos por un benchmark, indexados por nombre del caso."""
+
+    def __init__(self, benchmark, settings=None):
+        self.benchmark = benchmark
+        self.settings = settings or {}
+        self.cases = {}
+
+    # Ejecutar function repeat veces y guardar los tiempos (ms). setup, si se indica, se llama
+    # antes de cada repetición sin medirse; su resultado se pasa a function.
+    def measure(self, name, function, repeat=5, setup=None, **params):
+        samples = []
+        for _ in range(repeat):
+            arguments = (setup(),) if setup is not None else ()
+            started = time.perf_counter()
+            function(*arguments)
+            samples.append((time.perf_counter() - started) * 1000)
+        self.add(name, samples, **params)
+        return samples
+
+    def add(self, name, samples, **params):
+        self.cases[name] = {
+            "params": params,
+            "median_ms": statistics.median(samples),
+            "min_ms": min(samples),
+            "max_ms": max(samples),
+            "p95_ms": statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0],
+            "samples_ms": samples,
+        }
+
+    def to_dict(self):
+        return {
+            "benchmark": self.benchmark,
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "environment": environment(),
+            "settings": self.settings,
+            "cases": self.cases,
+        }
+
+    def save(self, path):
+        with open(path, "w") as out:
+            json.dump(self.to_dict(), out, indent=2)
+            out.write("\n")
+
+    def print_table(self, out=sys.stdout):
+        width = max([len(name) for name in self.cases] + [4])
+        print(f"{'case':<{width}} {'runs':>5} {'median ms':>10} {'p95 ms':>10} {'min ms':>10} {'max ms':>10}", file=out)
+        for name, case in self.cases.items():
+            print(
+                f"{name:<{width}} {len(case['samples_ms']):>5} {case['median_ms']:>10.2f} {case['p95_ms']:>10.2f} "
+                f"{case['min_ms']:>10.2f} {case['max_ms']:>10.2f}",
+                file=out
+            )
+
+
+def environment():
+    info = {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()}
+    for module in ("streamlit", "pyarrow", "fitz"):
+        try:
+            info[module] = getattr(__import__(module), "__version__", "unknown")
+        except ImportError:
+            info[module] = None
+    return info
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Comparar dos ficheros de resultados por la mediana de cada caso. Devuelve las filas
+# (caso, referencia, actual, proporción) y los casos más lentos que la referencia en más de threshold.
+def compare(current, baseline, threshold=0.2):
+    rows = []
+    regressions = []
+    for name, case in current["cases"].items():
+        reference = baseline["cases"].get(name)
+        if reference is None:
+            continue
+        ratio = case["median_ms"] / reference["median_ms"] if reference["median_ms"] else float("inf")
+        rows.append((name, reference["median_ms"], case["median_ms"], ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_comparison(rows, regressions, out=sys.stdout):
+    width = max([len(row[0]) for row in rows] + [4])
+    print(f"{'case':<{width}} {'baseline ms':>12} {'current ms':>11} {'ratio':>7}", file=out)
+    for name, reference, current, ratio in rows:
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<{width}} {reference:>12.2f} {current:>11.2f} {ratio:>6.2f}x{flag}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare benchmark results with a saved baseline.")
+    parser.add_argument("current", help="results JSON written with --output")
+    parser.add_argument("baseline", help="baseline results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown of the median (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    rows, regressions = compare(load(args.current), load(args.baseline), args.threshold)
+    print_comparison(rows, regressions)
+    if regressions:
+        print(f"{len(regressions)} cases are more than {args.threshold:.0%} slower than the baseline", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import io
+import json
+import os
+import sys
+
+from apptest import PAGE_SIZE, check, free_port, isolate, new_app, submit, upload, vote_key
+from baseline import Results
+from synthetic import synthetic_document, synthetic_pdf
+
+# Ejecuta la aplicación con el AppTest de Streamlit (sin navegador) contra el backend de
+# pruebas y mide reruns completos de la página JSON y de la principal.
+
+
+# Página JSON con un documento de categories x evidences: primera carga, rerun, votos y exportación
+def bench_json_page(results, categories, evidences, words, repeat, timeout, formats):
+    import export
+    import records
+
+    params = {"categories": categories, "evidences": evidences, "words": words}
+    suffix = f"[c={categories},e={evidences},w={words}]"
+    # Un anotador por caso, para que ningún caso empiece con los votos de otro
+    annotator = f"bench{suffix}"
+
+    # Carga en frío: un documento distinto en cada repetición, para no reutilizar la caché
+    seeds = iter(range(1, repeat + 1))
+
+    def cold_session():
+        seed = next(seeds)
+        raw = json.dumps(synthetic_document(categories, evidences, words, seed=seed, title=f"Cold paper {seed}")).encode()
+        at = new_app(timeout, "Json", {"json": upload("bench.json", raw)})
+        check(at.run())
+        return at.text_input[0]
+
+    results.measure(f"json_page_cold{suffix}", lambda name_input: check(name_input.input(annotator).run()),
+                    repeat, setup=cold_session, **params)
+
+    document = synthetic_document(categories, evidences, words)
+    raw = json.dumps(document).encode()
+    json_upload = upload("bench.json", raw)
+    at = new_app(timeout, "Json", {"json": json_upload})
+    check(at.run())
+    check(at.text_input[0].input(annotator).run())
+    results.measure(f"json_page_rerun{suffix}", lambda: check(at.run()), repeat, **params)
+
+    # Votos: se alterna entre las evidencias de la primera página (arriba, luego abajo, ...)
+    page_items = [(a, e) for a in range(categories) for e in range(evidences)][:PAGE_SIZE]
+    clicks = iter(range(repeat))
+
+    def vote_click():
+        click = next(clicks)
+        analysis_idx, evidence_idx = page_items[click % len(page_items)]
+        direction = "up" if (click // len(page_items)) % 2 == 0 else "down"
+        check(at.button(key=vote_key(json_upload[2], analysis_idx, evidence_idx, direction)).click().run())
+
+    results.measure(f"vote_click{suffix}", vote_click, repeat, **params)
+
+    # Exportación: rerun completo al pulsar "Prepare download" y solo la serialización
+    parsed = records.parse_document(document)
+    votes = {item: "1" for item in page_items}
+    for fmt in formats:
+        check(at.selectbox(key="json_export_format").set_value(fmt).run())
+        results.measure(f"export_click_{fmt}{suffix}", lambda: check(at.button(key="json_export_prepare").click().run()),
+                        repeat, **params)
+        results.measure(f"export_{fmt}{suffix}", lambda: export.export_document(parsed, fmt, annotator, votes), repeat, **params)
+
+    results.measure(f"transform_json{suffix}", lambda: records.transform_json(document, annotator), repeat, **params)
+    results.measure(f"load_document{suffix}", lambda: records.load_document(io.BytesIO(raw)), repeat, **params)
+
+
+# Página principal contra el backend de pruebas: envío hasta ver el resultado, envío de un
+# PDF ya analizado (caché) y rerun con el resultado en pantalla
+def bench_main_page(results, evidences, pdf_bytes, repeat, timeout):
+    import stub_backend
+
+    stub_backend.settings["evidences"] = evidences
+    params = {"evidences": evidences, "pdf_bytes": pdf_bytes, "latency": stub_backend.settings["latency"]}
+    suffix = f"[e={evidences},pdf={pdf_bytes}]"
+    # PDFs distintos en cada caso: la caché de análisis no depende del número de evidencias
+    first_seed = evidences * 1000 + 1
+    seeds = iter(range(first_seed, first_seed + repeat))
+
+    results.measure(
+        f"home_submit{suffix}", submit, repeat,
+        setup=lambda: check(new_app(timeout, "Home", {"pdf": upload("bench.pdf", synthetic_pdf(pdf_bytes, next(seeds)))}).run()),
+        **params
+    )
+    # El primer PDF del caso anterior ya está en la caché de análisis
+    cached_pdf = {"pdf": upload("bench.pdf", synthetic_pdf(pdf_bytes, first_seed))}
+    results.measure(
+        f"home_submit_cached{suffix}", submit, repeat,
+        setup=lambda: check(new_app(timeout, "Home", cached_pdf).run()),
+        **params
+    )
+
+    at = submit(check(new_app(timeout, "Home", cached_pdf).run()))
+    results.measure(f"home_rerun{suffix}", lambda: check(at.run()), repeat, **params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time full Streamlit script runs of the SolarChem UI with synthetic documents.")
+    parser.add_argument("--categories", type=int, nargs="+", default=[7, 50])
+    parser.add_argument("--evidences", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--words", type=int, default=60, help="words per evidence paragraph")
+    parser.add_argument("--pdf-bytes", type=int, default=2_000_000)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub backend latency per analysis (seconds)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120, help="AppTest timeout per script run (seconds)")
+    parser.add_argument("-o", "--output", help="write the results (JSON) to this file")
+    parser.add_argument("--compare", help="compare with this baseline results file")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    isolate()
+    os.environ["SOLAR_STUB_LATENCY"] = str(args.latency)
+
+    import backend
+    import stub_backend
+
+    url, server = stub_backend.run_in_thread(port=free_port())
+    backend.configure(url)
+
+    try:
+        import pyarrow  # noqa: F401
+        formats = ["json", "jsonl", "csv", "parquet"]
+    except ImportError:
+        formats = ["json", "jsonl", "csv"]
+
+    results = Results("bench_app", {key: value for key, value in vars(args).items() if key not in ("output", "compare")})
+    try:
+        for categories in args.categories:
+            for evidences in args.evidences:
+                print(f"JSON page: {categories} categories x {evidences} evidences", file=sys.stderr)
+                bench_json_page(results, categories, evidences, args.words, args.repeat, args.timeout, formats)
+        for evidences in args.evidences:
+            print(f"Home page: {evidences} evidences per category", file=sys.stderr)
+            bench_main_page(results, evidences, args.pdf_bytes, args.repeat, args.timeout)
+    finally:
+        server.should_exit = True
+
+    results.print_table()
+    if args.output:
+        results.save(args.output)
+    if args.compare:
+        import baseline
+
+        rows, regressions = baseline.compare(results.to_dict(), baseline.load(args.compare), args.threshold)
+        print()
+        baseline.print_comparison(rows, regressions)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web"))
+
+import records
+from baseline import Results
+from synthetic import synthetic_document
+
+# transform_json tal como estaba en streamlit.py antes de records.py, como referencia
+def legacy_transform_json(input_json, annotator_name):
+    transformed_data = {
+        "paper_title": input_json.get("paper_title", "Not available"),
+        "DOI": input_json.get("DOI", "Not available"),
+        "annotator_name": annotator_name,
+        "generation_model": input_json.get("generation_model", "Not available"),
+        "similarity_model": input_json.get("similarity_model", "Not available"),
+        "similarity_metric": input_json.get("similarity_metric", "Not available"),
+        "rag_type": input_json.get("rag_type", "Not available"),
+        "result": []
+    }
+    for result in input_json.get("result", []):
+        question_category = result.get("question_category", "Unknown Category")
+        query = result.get("query", "Not available")
+        generation = result.get("generation", "Not available")
+        RAG_source = result.get("RAG_source", "Not available")
+        ground_truth = result.get("ground_truth", "Not available")
+        selected_answer_dict = result.get("selected_answer", {})
+        selected_answer = "Not available"
+        for key, value in selected_answer_dict.items():
+            if question_category.replace(" ", "_").lower() in key.lower():
+                selected_answer = f"{key}: {value.strip()}"
+                break
+        evidences = result.get("evidences", [])
+        analysis_entry = {
+            "question_category": question_category,
+            "query": query,
+            "generation": generation,
+            "RAG_source": RAG_source,
+            "ground_truth": ground_truth,
+            "selected_answer": selected_answer,
+            "evidences": []
+        }
+        for evidence_idx, evidence in enumerate(evidences):
+            analysis_entry["evidences"].append({
+                "pdf_reference": evidence.get("pdf_reference", "Not available"),
+                "generated_facts": evidence.get("generated_facts", "Not available"),
+                "similarity_score": evidence.get("similarity_score", None),
+            })
+        transformed_data["result"].append(analysis_entry)
+    return transformed_data
+
+
+# Memoria (MB) que ocupa el resultado de function y pico durante la llamada, con tracemalloc
+def allocated(function):
+    tracemalloc.start()
+    value = function()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del value
+    return size / 1e6, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare transform_json with the typed, streaming parser in records.py.")
+    parser.add_argument("--categories", type=int, nargs="+", default=[7, 50, 200])
+    parser.add_argument("--evidences", type=int, default=50)
+    parser.add_argument("--words", type=int, default=80, help="words per evidence paragraph")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write the results (JSON) to this file")
+    args = parser.parse_args()
+
+    results = Results("bench_transform", {"evidences": args.evidences, "words": args.words, "repeat": args.repeat})
+
+    print(
+        f"{'categories':>10} {'MB':>5} {'json.loads':>10} {'legacy':>8} {'transform':>9} {'speedup':>7} "
+        f"{'records':>8} {'streamed':>8} {'dict MB':>7} {'peak':>5} {'records MB':>10} {'peak':>5}"
+    )
+    for categories in args.categories:
+        document = synthetic_document(categories, args.evidences, args.words)
+        raw = json.dumps(document).encode("utf-8")
+        expected = legacy_transform_json(document, "bench")
+        assert records.transform_json(document, "bench") == expected
+        assert records.to_transformed(records.load_document(io.BytesIO(raw)), "bench") == expected
+
+        params = {"categories": categories, "evidences": args.evidences, "words": args.words}
+        parse = min(results.measure(f"json_loads[c={categories}]", lambda: json.loads(raw), args.repeat, **params)) / 1000
+        legacy = min(results.measure(f"legacy_transform_json[c={categories}]", lambda: legacy_transform_json(document, "bench"), args.repeat, **params)) / 1000
+        transform = min(results.measure(f"transform_json[c={categories}]", lambda: records.transform_json(document, "bench"), args.repeat, **params)) / 1000
+        typed = min(results.measure(f"parse_document[c={categories}]", lambda: records.parse_document(document), args.repeat, **params)) / 1000
+        streamed = min(results.measure(f"load_document[c={categories}]", lambda: records.load_document(io.BytesIO(raw)), args.repeat, **params)) / 1000
+        dict_memory, dict_peak = allocated(lambda: legacy_transform_json(json.load(io.BytesIO(raw)), "bench"))
+        records_memory, records_peak = allocated(lambda: records.load_document(io.BytesIO(raw)))
+        print(
+            f"{categories:>10} {len(raw) / 1e6:>5.1f} {parse * 1000:>10.1f} {legacy * 1000:>8.2f} {transform * 1000:>9.2f} "
+            f"{legacy / transform:>6.2f}x {typed * 1000:>8.2f} {streamed * 1000:>8.1f} {dict_memory:>7.1f} {dict_peak:>5.1f} {records_memory:>10.1f} {records_peak:>5.1f}"
+        )
+    print("Times in ms (best of --repeat). legacy/transform/records exclude json.loads; streamed includes parsing.")
+    if args.output:
+        results.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
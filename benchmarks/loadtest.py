@@ -0,0 +1,203 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import traceback
+from queue import Empty
+
+from apptest import check, free_port, isolate, new_app, submit, upload
+from baseline import Results
+from synthetic import synthetic_pdf
+
+# Prueba de carga de la interfaz sin GROBID ni modelos: N sesiones de anotadores a la vez.
+# Cada sesión es un AppTest en su propio proceso, porque AppTest solo ejecuta un script cada
+# vez por proceso; así los reruns de todas las sesiones se ejecutan realmente a la vez. Las
+# sesiones comparten las bases de datos (trabajos y votos) y la caché de análisis en disco,
+# pero no las cachés en memoria de un único servidor de Streamlit (documentos, índices de
+# PDF). El backend es stub_backend.py, con respuestas sintéticas o reproduciendo una
+# grabación (SOLAR_RECORD_FILE), en el proceso principal.
+#
+# Cada sesión: abre la página principal, envía un PDF y espera el resultado (consultando cada
+# jobs.POLL_SECONDS, como la página), lo abre en la página JSON, vota evidencias una a una con
+# un tiempo de reflexión y prepara la exportación.
+
+QUICK_MODE = "One by one (keyboard)"
+
+
+class Session:
+    """Un anotador simulado; los tiempos de cada acción (ms) se guardan en timings."""
+
+    def __init__(self, idx, args):
+        self.idx = idx
+        self.args = args
+        self.timings = {}
+        self.rng = random.Random(args.seed + idx)
+
+    def timed(self, action, function):
+        started = time.perf_counter()
+        result = function()
+        self.timings.setdefault(action, []).append((time.perf_counter() - started) * 1000)
+        return result
+
+    def think(self):
+        if self.args.think > 0:
+            time.sleep(self.rng.expovariate(1 / self.args.think))
+
+    def run_once(self, iteration):
+        import jobs
+
+        args = self.args
+        # Con --same-pdf todas las sesiones envían el mismo artículo (después del primero, de la caché)
+        seed = 0 if args.same_pdf else self.idx * 1000 + iteration + 1
+        pdf = upload(f"paper_{seed}.pdf", synthetic_pdf(args.pdf_bytes, seed))
+
+        home = new_app(args.timeout, "Home", {"pdf": pdf})
+        self.timed("home_open", lambda: check(home.run()))
+        self.think()
+        self.timed("submit", lambda: submit(home, jobs.POLL_SECONDS))
+
+        result = jobs.get_job(home.session_state["job_id"])["result"]
+        raw = json.dumps(result).encode("utf-8")
+        self.think()
+
+        page = new_app(args.timeout, "Json", {"json": upload(f"result_{seed}.json", raw)})
+        check(page.run())
+        self.timed("json_open", lambda: check(page.text_input[0].input(f"annotator_{self.idx}").run()))
+        check(page.radio(key="voting_mode").set_value(QUICK_MODE).run())
+
+        for _ in range(args.votes):
+            self.think()
+            button = self.rng.choice(["quick_up", "quick_up", "quick_down"])
+            self.timed("vote", lambda: check(page.button(key=button).click().run()))
+
+        self.think()
+        self.timed("export", lambda: check(page.button(key="json_export_prepare").click().run()))
+
+    def run(self):
+        errors = []
+        time.sleep(self.rng.uniform(0, self.args.ramp))
+        for iteration in range(self.args.iterations):
+            try:
+                self.run_once(iteration)
+            except Exception:
+                errors.append((self.idx, traceback.format_exc(limit=3)))
+        return errors
+
+
+# Proceso de una sesión. La configuración (base de datos de votos, caché y directorio de
+# trabajo) se hereda del proceso principal; todas las sesiones empiezan a la vez cuando están
+# listas. Cada proceso tiene su propia base de datos de trabajos: al arrancar, jobs.py da por
+# interrumpidos los trabajos en curso, que serían los de las demás sesiones.
+def run_session(idx, args, backend_url, ready, results):
+    os.environ["SOLAR_JOBS_DB"] = os.path.abspath(f"jobs_{idx}.db")
+    try:
+        import backend
+
+        backend.configure(backend_url)
+        session = Session(idx, args)
+        # Importar la aplicación antes de empezar, como un servidor que ya está en marcha
+        check(new_app(args.timeout, "About", {}).run())
+    except Exception:
+        # Sin esta sesión la prueba no puede empezar
+        ready.abort()
+        raise
+    ready.wait()
+    results.put((idx, session.timings, session.run()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent annotator sessions against the SolarChem UI, fully offline.")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent annotator sessions")
+    parser.add_argument("--iterations", type=int, default=1, help="papers analyzed and annotated by each session")
+    parser.add_argument("--votes", type=int, default=20, help="votes per paper")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time between actions (seconds)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="sessions start at random times within this many seconds")
+    parser.add_argument("--same-pdf", action="store_true", help="all sessions submit the same paper")
+    parser.add_argument("--pdf-bytes", type=int, default=1_000_000)
+    parser.add_argument("--replay", help="replay this recording (JSONL written with SOLAR_RECORD_FILE)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply recorded latencies by this factor (0 = no waiting)")
+    parser.add_argument("--latency", type=float, default=2.0, help="latency of synthetic analyses when not replaying (seconds)")
+    parser.add_argument("--backend-url", help="use this backend instead of starting the stub backend")
+    parser.add_argument("--timeout", type=float, default=300, help="AppTest timeout per script run (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the results (JSON) to this file")
+    args = parser.parse_args()
+
+    replay = os.path.abspath(args.replay) if args.replay else None
+    isolate("solar-load-")
+    os.environ["SOLAR_STUB_LATENCY"] = str(args.latency)
+
+    server = None
+    if args.backend_url:
+        url = args.backend_url
+    else:
+        import stub_backend
+
+        url, server = stub_backend.run_in_thread(port=free_port(), replay=replay, replay_latency_scale=args.latency_scale)
+
+    # "spawn": cada sesión empieza en un intérprete nuevo, sin los hilos del backend de pruebas
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(args.sessions + 1)
+    queue = context.Queue()
+    processes = [
+        context.Process(target=run_session, args=(idx, args, url, ready, queue), name=f"annotator-{idx}")
+        for idx in range(args.sessions)
+    ]
+    timings = {}
+    errors = []
+    print(f"Starting {args.sessions} session processes...", file=sys.stderr)
+    try:
+        for process in processes:
+            process.start()
+        ready.wait(timeout=args.timeout)
+        print(f"Running {args.sessions} sessions x {args.iterations} papers...", file=sys.stderr)
+        started = time.perf_counter()
+        finished = set()
+        while len(finished) < len(processes):
+            try:
+                idx, session_timings, session_errors = queue.get(timeout=1)
+            except Empty:
+                # Un proceso que termina con error no envía sus tiempos
+                for idx, process in enumerate(processes):
+                    if idx not in finished and process.exitcode not in (None, 0):
+                        finished.add(idx)
+                        errors.append((idx, f"The session process exited with code {process.exitcode}"))
+                continue
+            finished.add(idx)
+            for action, samples in session_timings.items():
+                timings.setdefault(action, []).extend(samples)
+            errors.extend(session_errors)
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        if server is not None:
+            server.should_exit = True
+
+    settings = {key: value for key, value in vars(args).items() if key != "output"}
+    results = Results("loadtest", settings)
+    for action, samples in timings.items():
+        results.add(action, samples, sessions=args.sessions)
+    results.print_table()
+
+    actions = sum(len(samples) for samples in timings.values())
+    print(f"\n{actions} actions in {elapsed:.1f} s ({actions / elapsed:.2f} actions/s), {len(errors)} failed sessions or iterations")
+    for idx, error in errors[:5]:
+        print(f"\nSession {idx}:\n{error}", file=sys.stderr)
+
+    if args.output:
+        results.settings["wall_seconds"] = elapsed
+        results.settings["errors"] = len(errors)
+        results.save(args.output)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import json
+import os
+import random
+
+# Generador de resultados de análisis sintéticos con el mismo esquema que devuelve el
+# backend (y que lee records.py), para medir cómo escala la interfaz con el tamaño.
+
+CATEGORIES = ["catalyst", "co_catalyst", "light_source", "lamp", "reaction_medium", "reactor_type", "operation_mode"]
+
+WORDS = (
+    "the photocatalytic reaction was carried out under visible light irradiation using a "
+    "TiO2 catalyst loaded with Pt nanoparticles as co-catalyst in an aqueous methanol solution "
+    "inside a quartz batch reactor with a xenon lamp of 300 W and the hydrogen evolution rate "
+    "was measured by gas chromatography"
+).split()
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def category_names(categories):
+    if categories <= len(CATEGORIES):
+        return CATEGORIES[:categories]
+    return [f"{CATEGORIES[idx % len(CATEGORIES)]}_{idx}" for idx in range(categories)]
+
+
+# Documento de resultados con categories categorías, evidences evidencias por categoría y
+# words palabras por párrafo. Como el backend, selected_answer lleva todas las respuestas.
+# Cada tamaño y semilla tiene su propio DOI.
+def synthetic_document(categories=7, evidences=5, words=40, seed=0, title="Synthetic paper"):
+    rng = random.Random(seed)
+    names = category_names(categories)
+    answers = {name: f" {_text(rng, 3)} " for name in names}
+    return {
+        "paper_title": title,
+        "DOI": f"10.0000/synthetic.{categories}x{evidences}x{words}.{seed}",
+        "generation_model": "llama3.1",
+        "similarity_model": "nomic-embed-text",
+        "similarity_metric": "cosine",
+        "rag_type": "fact",
+        "result": [
+            {
+                "question_category": name,
+                "query": f"What is the {name.replace('_', ' ')} used in the paper?",
+                "generation": _text(rng, words // 2 + 1),
+                "RAG_source": "fact",
+                "ground_truth": "Not available",
+                "selected_answer": answers,
+                "evidences": [
+                    {
+                        "pdf_reference": _text(rng, words),
+                        "generated_facts": _text(rng, words // 4 + 1),
+                        "similarity_score": round(1 - idx / (evidences + 1), 3),
+                    }
+                    for idx in range(evidences)
+                ],
+            }
+            for name in names
+        ],
+    }
+
+
+# Contenido de un "PDF" de size bytes; el backend de pruebas no lo interpreta, solo lo guarda
+def synthetic_pdf(size=100_000, seed=0):
+    header = b"%PDF-1.4\n"
+    return header + random.Random(seed).randbytes(max(0, size - len(header)))
+
+
+# Fichero JSONL con count documentos, como el que escribe un lote
+def write_jsonl(path, count, seed=0, **params):
+    with open(path, "w", encoding="utf-8") as out:
+        for idx in range(count):
+            document = synthetic_document(seed=seed + idx, title=f"Synthetic paper {idx}", **params)
+            out.write(json.dumps({"file_name": f"paper_{idx}.pdf", **document}) + "\n")
+    return os.path.getsize(path)
@@ -0,0 +1,222 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+
+import records
+
+# Valor de la matriz de votos cuando un anotador no votó una evidencia
+NO_VOTE = -1
+
+
+# Buscar los ficheros exportados ({annotator}_updated.json) en las rutas indicadas
+def find_exports(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(".json"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+# Identificador de un documento exportado sin DOI ni título: hash de sus resultados sin los
+# votos, el mismo para todos los anotadores que exportaron el mismo fichero de resultados
+def content_id(document):
+    result = [
+        dict(analysis, evidences=[
+            {key: value for key, value in evidence.items() if key != "vote"}
+            for evidence in analysis.get("evidences", [])
+        ])
+        for analysis in document.get("result", [])
+    ]
+    return "sha256:" + hashlib.sha256(json.dumps(result, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Artículo de un documento exportado: DOI, título o, si faltan los dos, hash del contenido.
+# "Download JSON" escribe "Not available" cuando el documento no tiene el campo.
+def paper_key(document):
+    for field in ("DOI", "paper_title"):
+        value = document.get(field)
+        if value and value != records.NOT_AVAILABLE:
+            return value
+    return content_id(document)
+
+
+# Leer un fichero exportado y devolver solo los votos en forma compacta:
+# (paper, category, pdf_reference, annotator, vote, similarity_score)
+def read_votes(path):
+    with open(path, "r") as f:
+        document = json.load(f)
+    paper = paper_key(document)
+    annotator = document.get("annotator_name") or os.path.basename(path)
+    rows = []
+    for analysis in document.get("result", []):
+        category = analysis.get("question_category", "Unknown Category")
+        for evidence in analysis.get("evidences", []):
+            vote = str(evidence.get("vote"))
+            if vote not in ("0", "1"):
+                continue
+            rows.append((paper, category, evidence.get("pdf_reference", ""), annotator, int(vote), evidence.get("similarity_score")))
+    return rows
+
+
+# Alinear los votos de todos los ficheros: matriz evidencias x anotadores (1, 0 o NO_VOTE)
+def build_vote_matrix(paths, workers=None):
+    items = {}
+    annotators = {}
+    scores = []
+    entries = []
+    paths = list(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+        for rows in executor.map(read_votes, paths, chunksize=chunksize):
+            for paper, category, pdf_reference, annotator, vote, score in rows:
+                key = (paper, category, pdf_reference)
+                item_idx = items.get(key)
+                if item_idx is None:
+                    item_idx = items[key] = len(items)
+                    scores.append(np.nan if score is None else float(score))
+                annotator_idx = annotators.setdefault(annotator, len(annotators))
+                entries.append((item_idx, annotator_idx, vote))
+
+    matrix = np.full((len(items), len(annotators)), NO_VOTE, dtype=np.int8)
+    if entries:
+        entries = np.array(entries, dtype=np.int64)
+        matrix[entries[:, 0], entries[:, 1]] = entries[:, 2]
+    return list(items), list(annotators), matrix, np.array(scores, dtype=float)
+
+
+# Etiqueta mayoritaria por evidencia: 1, 0 o NO_VOTE si hay empate o no hay votos
+def majority_labels(matrix):
+    positives = (matrix == 1).sum(axis=1)
+    negatives = (matrix == 0).sum(axis=1)
+    labels = np.full(len(matrix), NO_VOTE, dtype=np.int8)
+    labels[positives > negatives] = 1
+    labels[negatives > positives] = 0
+    return labels
+
+
+# Kappa de Fleiss (admite un número distinto de anotadores por evidencia)
+def fleiss_kappa(matrix):
+    positives = (matrix == 1).sum(axis=1).astype(float)
+    negatives = (matrix == 0).sum(axis=1).astype(float)
+    raters = positives + negatives
+    mask = raters >= 2
+    if not mask.any():
+        return None
+    positives, negatives, raters = positives[mask], negatives[mask], raters[mask]
+    agreement = (positives * (positives - 1) + negatives * (negatives - 1)) / (raters * (raters - 1))
+    p_positive = positives.sum() / raters.sum()
+    expected = p_positive ** 2 + (1 - p_positive) ** 2
+    if expected == 1:
+        return 1.0
+    return float((agreement.mean() - expected) / (1 - expected))
+
+
+# Kappa de Cohen entre dos anotadores, sobre las evidencias que votaron ambos
+def cohen_kappa(votes_a, votes_b):
+    mask = (votes_a != NO_VOTE) & (votes_b != NO_VOTE)
+    if not mask.any():
+        return None
+    a, b = votes_a[mask], votes_b[mask]
+    observed = (a == b).mean()
+    expected = a.mean() * b.mean() + (1 - a.mean()) * (1 - b.mean())
+    if expected == 1:
+        return 1.0
+    return float((observed - expected) / (1 - expected))
+
+
+def pairwise_cohen_kappa(annotators, matrix):
+    result = {}
+    for i, j in combinations(range(len(annotators)), 2):
+        kappa = cohen_kappa(matrix[:, i], matrix[:, j])
+        if kappa is not None:
+            result[f"{annotators[i]} | {annotators[j]}"] = kappa
+    return result
+
+
+# Precisión del recuperador por categoría (evidencias relevantes según la mayoría) y
+# relación entre la etiqueta y similarity_score
+def category_precision(items, labels, scores):
+    categories = np.array([category for _, category, _ in items], dtype=object)
+    summary = {}
+    for category in sorted(set(categories)):
+        mask = (categories == category) & (labels != NO_VOTE)
+        if not mask.any():
+            continue
+        category_labels = labels[mask]
+        category_scores = scores[mask]
+        relevant = category_scores[(category_labels == 1) & ~np.isnan(category_scores)]
+        irrelevant = category_scores[(category_labels == 0) & ~np.isnan(category_scores)]
+        valid = ~np.isnan(category_scores)
+        correlation = None
+        if valid.sum() > 1 and np.std(category_scores[valid]) > 0 and np.std(category_labels[valid]) > 0:
+            correlation = float(np.corrcoef(category_scores[valid], category_labels[valid])[0, 1])
+        summary[category] = {
+            "evidences": int(mask.sum()),
+            "precision": float((category_labels == 1).mean()),
+            "mean_similarity_relevant": float(relevant.mean()) if len(relevant) else None,
+            "mean_similarity_irrelevant": float(irrelevant.mean()) if len(irrelevant) else None,
+            "similarity_label_correlation": correlation,
+        }
+    return summary
+
+
+# Agregar todos los ficheros exportados y calcular el acuerdo entre anotadores
+def aggregate(paths, workers=None):
+    items, annotators, matrix, scores = build_vote_matrix(find_exports(paths), workers)
+    labels = majority_labels(matrix)
+    pairwise = pairwise_cohen_kappa(annotators, matrix)
+    summary = {
+        "evidences": len(items),
+        "annotators": annotators,
+        "votes": int((matrix != NO_VOTE).sum()),
+        "fleiss_kappa": fleiss_kappa(matrix),
+        "cohen_kappa": pairwise,
+        "mean_cohen_kappa": float(np.mean(list(pairwise.values()))) if pairwise else None,
+        "categories": category_precision(items, labels, scores),
+    }
+    return summary, items, matrix, labels
+
+
+# Escribir una fila por evidencia con sus votos y la etiqueta mayoritaria
+def write_items(out, items, matrix, labels):
+    writer = csv.writer(out)
+    writer.writerow(["paper", "category", "pdf_reference", "positive_votes", "negative_votes", "majority_label"])
+    positives = (matrix == 1).sum(axis=1)
+    negatives = (matrix == 0).sum(axis=1)
+    for idx, (paper, category, pdf_reference) in enumerate(items):
+        label = "" if labels[idx] == NO_VOTE else int(labels[idx])
+        writer.writerow([paper, category, pdf_reference, int(positives[idx]), int(negatives[idx]), label])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate the votes of several annotators and compute their agreement.")
+    parser.add_argument("paths", nargs="+", help="exported *_updated.json files or directories containing them")
+    parser.add_argument("-o", "--output", help="write the summary as JSON to this file (default: standard output)")
+    parser.add_argument("--items", help="write one CSV row per evidence with its majority label to this file")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    summary, items, matrix, labels = aggregate(args.paths, args.workers)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=4)
+    else:
+        json.dump(summary, sys.stdout, indent=4)
+        print()
+    if args.items:
+        with open(args.items, "w", newline="") as f:
+            write_items(f, items, matrix, labels)
+
+
+if __name__ == "__main__":
+    main()
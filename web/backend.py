@@ -0,0 +1,342 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import recording
+
+# URL del backend de análisis (FastAPI); se puede cambiar en ejecución con configure()
+BACKEND_URL = os.environ.get("SOLAR_BACKEND_URL", "http://127.0.0.1:8000")
+ANALYSIS_PATH = "/analysis/"
+# Endpoint que envía los resultados por categoría a medida que se generan (NDJSON o SSE),
+# terminado con un objeto {"done": true, "categories": N}
+STREAM_PATH = "/analysis/stream/"
+# Endpoint donde se sube el PDF, identificado por su SHA-256
+UPLOADS_PATH = "/uploads/"
+STREAMING = os.environ.get("SOLAR_STREAMING", "1") != "0"
+# Grabar cada llamada a /analysis/ (argumentos, respuesta y tiempos) en este fichero JSONL,
+# para reproducirla después con stub_backend.py (SOLAR_STUB_REPLAY)
+RECORD_FILE = os.environ.get("SOLAR_RECORD_FILE", "")
+
+# Tamaño máximo de PDF aceptado y tamaño de cada trozo enviado
+MAX_UPLOAD_BYTES = int(float(os.environ.get("SOLAR_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Tiempos máximos (segundos): conexión, análisis completo y resto de llamadas
+CONNECT_TIMEOUT = float(os.environ.get("SOLAR_CONNECT_TIMEOUT", "5"))
+ANALYSIS_TIMEOUT = float(os.environ.get("SOLAR_ANALYSIS_TIMEOUT", "1800"))
+REQUEST_TIMEOUT = float(os.environ.get("SOLAR_REQUEST_TIMEOUT", "120"))
+
+# Reintentos de las llamadas idempotentes, con espera exponencial y jitter
+RETRIES = int(os.environ.get("SOLAR_RETRIES", "3"))
+BACKOFF_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 10
+RETRY_STATUS = (429, 502, 503, 504)
+
+# Conexiones reutilizables por host en el pool compartido
+POOL_SIZE = int(os.environ.get("SOLAR_POOL_SIZE", "16"))
+
+CONNECTION_ERROR = "Error: No se pudo conectar al servidor. Verifica que el backend está activo."
+
+
+class BackendError(Exception):
+    """Error devuelto (o provocado) por el backend de análisis."""
+
+
+class CircuitBreaker:
+    """Deja de llamar al backend tras varios fallos seguidos y vuelve a probar pasado un tiempo."""
+
+    def __init__(self, threshold=5, reset_seconds=30):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    # Comprobar si se puede llamar; con el circuito abierto solo pasa una prueba cada reset_seconds
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                raise BackendError("Error: El backend no está disponible temporalmente. Inténtalo de nuevo en unos segundos.")
+            # Medio abierto: se deja pasar esta llamada y se reinicia la espera
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_seconds else "half-open"
+
+
+breaker = CircuitBreaker(
+    threshold=int(os.environ.get("SOLAR_BREAKER_THRESHOLD", "5")),
+    reset_seconds=float(os.environ.get("SOLAR_BREAKER_RESET_SECONDS", "30")),
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# Sesión HTTP compartida por todo el proceso (pool de conexiones keep-alive)
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+# Cambiar la URL del backend (por ejemplo, para apuntar al backend de pruebas)
+def configure(backend_url):
+    global BACKEND_URL
+    BACKEND_URL = backend_url.rstrip("/")
+
+
+def _url(path):
+    return f"{BACKEND_URL}{path}"
+
+
+# Latencia de una petición al backend; las subidas se agrupan en un solo endpoint
+def _observe(method, path, status, started):
+    if metrics.ENABLED:
+        endpoint = UPLOADS_PATH if path.startswith(UPLOADS_PATH) else path
+        metrics.observe("solar_backend_request_seconds", time.perf_counter() - started, method=method, endpoint=endpoint, status=status)
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+
+
+# Hacer una petición con el pool compartido. Las idempotentes se reintentan ante errores de
+# conexión, timeouts y respuestas 429/5xx transitorias. Si data es una función, se llama en
+# cada intento para generar de nuevo el cuerpo.
+def _request(method, path, idempotent=False, timeout=REQUEST_TIMEOUT, data=None, **kwargs):
+    attempts = RETRIES + 1 if idempotent else 1
+    for attempt in range(attempts):
+        breaker.before_call()
+        last_attempt = attempt == attempts - 1
+        started = time.perf_counter()
+        try:
+            response = get_session().request(
+                method, _url(path),
+                data=data() if callable(data) else data,
+                timeout=(CONNECT_TIMEOUT, timeout),
+                **kwargs
+            )
+        except requests.exceptions.Timeout:
+            _observe(method, path, "timeout", started)
+            breaker.record_failure()
+            if last_attempt:
+                raise BackendError("Error: El servidor tardó demasiado en responder.")
+        except requests.exceptions.ConnectionError:
+            _observe(method, path, "connection_error", started)
+            breaker.record_failure()
+            if last_attempt:
+                raise BackendError(CONNECTION_ERROR)
+        else:
+            _observe(method, path, response.status_code, started)
+            if response.status_code < 500:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            if response.status_code not in RETRY_STATUS or last_attempt:
+                return response
+            response.close()
+        time.sleep(_backoff(attempt))
+
+
+def _raise_for_status(response, prefix="Error en el servidor"):
+    message = f"{prefix}: {response.status_code}"
+    if response.text:
+        message += f"\nDetalles: {response.text}"
+    error = BackendError(message)
+    error.status = response.status_code
+    raise error
+
+
+_recording = threading.local()
+
+
+# Grabar las llamadas de una función de análisis en RECORD_FILE, con el momento en que llega
+# cada categoría. Las llamadas anidadas (stream_analysis que recurre a run_analysis) se graban una vez.
+def _recorded(path, mode):
+    def decorate(function):
+        @functools.wraps(function)
+        def run(args_dict, report=None):
+            if not RECORD_FILE or getattr(_recording, "active", False):
+                return function(args_dict, report)
+
+            started = time.perf_counter()
+            offsets = []
+
+            def record_report(partial):
+                if len(partial.get("result", [])) > len(offsets):
+                    offsets.append(time.perf_counter() - started)
+                if report is not None:
+                    report(partial)
+
+            entry = {"path": path, "mode": mode, "args": args_dict}
+            _recording.active = True
+            try:
+                result = function(args_dict, record_report)
+            except BackendError as e:
+                entry.update(seconds=time.perf_counter() - started, status=getattr(e, "status", None), error=str(e))
+                recording.record(RECORD_FILE, entry)
+                raise
+            finally:
+                _recording.active = False
+            entry.update(seconds=time.perf_counter() - started, offsets=offsets or None, status=200, response=result)
+            recording.record(RECORD_FILE, entry)
+            return result
+        return run
+    return decorate
+
+
+# Configuración del pipeline de análisis para un PDF
+def default_args(file_name=""):
+    return {
+        "llm_id": "llama3.1",
+        "embedding_id": "nomic-embed-text",
+        "input_file_path": file_name,
+        "prompt_file": "prompts.json",
+        "context_file_path": "context.json",
+        "rag_type": "fact"
+    }
+
+
+# Llamada al backend: devuelve el JSON del análisis o lanza BackendError
+@_recorded(ANALYSIS_PATH, "blocking")
+def run_analysis(args_dict, report=None):
+    started = time.perf_counter()
+    response = _request("POST", ANALYSIS_PATH, timeout=ANALYSIS_TIMEOUT, json=args_dict)
+    if response.status_code != 200:
+        _raise_for_status(response)
+
+    try:
+        with metrics.span("parse_response"):
+            result = response.json()
+    except ValueError:
+        raise BackendError("Error: El servidor devolvió una respuesta no válida.")
+    metrics.observe("solar_analysis_seconds", time.perf_counter() - started, mode="blocking")
+    return result
+
+
+# Convertir una línea NDJSON o un evento SSE ("data: {...}") en un objeto; None si no hay datos
+def _parse_line(line):
+    line = line.strip()
+    if not line or line.startswith(":") or line.startswith("event:") or line.startswith("id:"):
+        return None
+    if line.startswith("data:"):
+        line = line[len("data:"):].strip()
+    return json.loads(line)
+
+
+# Llamada en modo streaming: cada categoría se añade al resultado en cuanto llega y se
+# notifica con report(resultado_parcial). Si el backend no ofrece streaming se usa run_analysis.
+# Si la respuesta acaba sin el objeto final "done" (o faltan categorías) se lanza BackendError,
+# para que un resultado incompleto nunca se dé por terminado ni se guarde en la caché.
+@_recorded(STREAM_PATH, "stream")
+def stream_analysis(args_dict, report=None):
+    if not STREAMING:
+        return run_analysis(args_dict, report)
+
+    started = time.perf_counter()
+    response = _request("POST", STREAM_PATH, timeout=ANALYSIS_TIMEOUT, json=args_dict, stream=True)
+    with response:
+        if response.status_code in (404, 405):
+            return run_analysis(args_dict, report)
+        if response.status_code != 200:
+            _raise_for_status(response)
+
+        temp = {"result": []}
+        end = None
+        try:
+            for line in response.iter_lines():
+                item = _parse_line(line.decode("utf-8"))
+                if item is None:
+                    continue
+                if item.get("done"):
+                    end = item
+                    break
+                # Las líneas con "question_category" son categorías; el resto, datos del documento
+                if "question_category" in item:
+                    temp["result"].append(item)
+                else:
+                    item.pop("result", None)
+                    temp.update(item)
+                if report is not None:
+                    report(temp)
+        except ValueError:
+            raise BackendError("Error: El servidor devolvió una respuesta no válida.")
+        except requests.exceptions.RequestException as e:
+            raise BackendError(f"Error: Se perdió la conexión con el servidor: {e}")
+    expected = end.get("categories") if end is not None else None
+    if end is None or (expected is not None and expected != len(temp["result"])):
+        raise BackendError(
+            f"Error: El servidor cerró la conexión antes de terminar el análisis ({len(temp['result'])} categorías recibidas)."
+        )
+    metrics.observe("solar_analysis_seconds", time.perf_counter() - started, mode="stream")
+    return temp
+
+
+# Recorrer el buffer del PDF en trozos sin copiarlo (cortes de un memoryview)
+def _iter_chunks(buffer):
+    view = memoryview(buffer)
+    for start in range(0, len(view), UPLOAD_CHUNK_BYTES):
+        yield view[start:start + UPLOAD_CHUNK_BYTES]
+
+
+# Subir el PDF al backend si todavía no lo tiene. El backend lo guarda bajo su SHA-256,
+# lo que permite deduplicar y saltarse la subida de un fichero ya visto. Se pregunta siempre
+# con HEAD, porque el backend puede haber perdido sus ficheros o ser otro. Ambas llamadas
+# son idempotentes (el destino lo determina el contenido) y se reintentan.
+def upload_pdf(buffer, digest, file_name):
+    if len(buffer) > MAX_UPLOAD_BYTES:
+        raise BackendError(f"Error: El PDF supera el tamaño máximo permitido ({MAX_UPLOAD_BYTES // (1024 * 1024)} MB).")
+
+    path = f"{UPLOADS_PATH}{digest}"
+    response = _request("HEAD", path, idempotent=True)
+    if response.status_code != 200:
+        response = _request(
+            "PUT", path, idempotent=True,
+            data=lambda: _iter_chunks(buffer),
+            headers={
+                "Content-Type": "application/pdf",
+                "X-Content-SHA256": digest,
+                "X-Upload-Length": str(len(buffer)),
+                "X-File-Name": file_name,
+            },
+        )
+    if response.status_code not in (200, 201, 204):
+        _raise_for_status(response, "Error al subir el PDF")
+
+
+# Envolver una tarea de análisis para que suba antes el PDF e indique su hash al backend
+def with_upload(task, buffer, digest, file_name):
+    def run(args_dict, report=None):
+        upload_pdf(buffer, digest, file_name)
+        return task(dict(args_dict, input_file_sha256=digest), report)
+    return run
@@ -0,0 +1,279 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import backend
+import cache
+
+# Número de artículos que se envían al backend a la vez, por defecto
+CONCURRENCY = int(os.environ.get("SOLAR_BATCH_CONCURRENCY", "4"))
+# Directorio donde se escriben los resultados de cada lote
+OUTPUT_DIR = os.environ.get("SOLAR_BATCH_DIR", "batches")
+# Segundos que se conserva el resumen de un lote terminado (sus resultados siguen en OUTPUT_DIR)
+FINISHED_KEEP_SECONDS = float(os.environ.get("SOLAR_BATCH_KEEP_SECONDS", "86400"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+class Paper:
+    """Artículo de un lote. El PDF se lee con load() solo cuando se envía; source es el
+    fichero del que se lee (un ZIP), que se cierra al terminar el lote."""
+
+    def __init__(self, name, load, sha256, doi=None, source=None):
+        self.name = name
+        self.load = load
+        self.sha256 = sha256
+        self.doi = doi
+        self.source = source
+        self.status = QUEUED
+        self.error = None
+        self.seconds = None
+
+
+def _hash_stream(stream):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Leer un CSV con columnas file y doi (o las dos primeras columnas) -> {nombre: doi}
+def read_dois(stream):
+    text = stream.read()
+    if isinstance(text, bytes):
+        text = text.decode("utf-8-sig")
+    dois = {}
+    for row in csv.reader(io.StringIO(text)):
+        if len(row) < 2 or row[0].strip().lower() in ("file", "filename", "file_name"):
+            continue
+        dois[os.path.basename(row[0].strip())] = row[1].strip()
+    return dois
+
+
+# PDFs contenidos en un ZIP; cada uno se lee del ZIP cuando se envía
+def papers_from_zip(source):
+    archive = zipfile.ZipFile(source)
+    lock = threading.Lock()
+    papers = []
+    for member in archive.infolist():
+        if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+            continue
+        with archive.open(member) as f:
+            sha256 = _hash_stream(f)
+
+        def load(member=member):
+            with lock:
+                return archive.read(member)
+
+        papers.append(Paper(os.path.basename(member.filename), load, sha256, source=archive))
+    return papers
+
+
+# Artículo a partir de un fichero ya en memoria (por ejemplo, un UploadedFile de Streamlit)
+def paper_from_buffer(name, file):
+    return Paper(name, file.getbuffer, cache.pdf_digest(file.getbuffer()))
+
+
+# Artículo a partir de un PDF en disco
+def paper_from_path(path):
+    def load():
+        with open(path, "rb") as f:
+            return f.read()
+
+    with open(path, "rb") as f:
+        sha256 = _hash_stream(f)
+    return Paper(os.path.basename(path), load, sha256)
+
+
+class BatchRun:
+    """Estado de un lote en curso: artículos, progreso y fichero JSONL de resultados."""
+
+    def __init__(self, papers, args_dict, concurrency, output_path, prompt_path):
+        self.id = uuid.uuid4().hex
+        self.papers = papers
+        self.args_dict = args_dict
+        self.concurrency = concurrency
+        self.output_path = output_path or os.path.join(OUTPUT_DIR, f"{self.id}.jsonl")
+        self.prompt_path = prompt_path
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    # Resumen del progreso: contadores, rendimiento (artículos por hora) y tiempo restante
+    def progress(self):
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, DUPLICATE: 0}
+        for paper in self.papers:
+            counts[paper.status] += 1
+        total = len(self.papers) - counts[DUPLICATE]
+        completed = counts[DONE] + counts[FAILED]
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        rate = completed / elapsed if elapsed and completed else 0.0
+        remaining = total - completed
+        return {
+            "total": total,
+            "completed": completed,
+            **counts,
+            "elapsed": elapsed,
+            "papers_per_hour": rate * 3600,
+            "eta": remaining / rate if rate else None,
+            "finished": self.finished is not None,
+        }
+
+    def _write(self, record):
+        with self._lock:
+            with open(self.output_path, "a") as out:
+                out.write(json.dumps(record) + "\n")
+
+    def _process(self, paper):
+        paper.status = RUNNING
+        started = time.time()
+        args_dict = dict(self.args_dict, input_file_path=paper.name)
+        try:
+            key = cache.cache_key(paper.sha256, args_dict, self.prompt_path)
+            result = cache.get(key)
+            if result is None:
+                buffer = paper.load()
+                backend.upload_pdf(buffer, paper.sha256, paper.name)
+                del buffer
+                result = backend.run_analysis(dict(args_dict, input_file_sha256=paper.sha256))
+                cache.put(key, result)
+            if paper.doi:
+                result["DOI"] = paper.doi
+            self._write({"file_name": paper.name, "sha256": paper.sha256, **result})
+            paper.status = DONE
+        except backend.BackendError as e:
+            paper.error = str(e)
+            paper.status = FAILED
+        except Exception as e:
+            paper.error = f"Error inesperado: {e}"
+            paper.status = FAILED
+        finally:
+            # El PDF ya no hace falta: se suelta la referencia al fichero subido o al ZIP
+            paper.load = None
+        paper.seconds = time.time() - started
+
+    # Soltar los PDFs y cerrar los ZIP; del lote terminado solo queda el resumen de cada artículo
+    def _release(self):
+        sources = {}
+        for paper in self.papers:
+            if paper.source is not None:
+                sources[id(paper.source)] = paper.source
+            paper.load = None
+            paper.source = None
+        for source in sources.values():
+            source.close()
+
+    def run(self):
+        self.started = time.time()
+        try:
+            open(self.output_path, "w").close()
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="solar-batch") as executor:
+                list(executor.map(self._process, [paper for paper in self.papers if paper.status == QUEUED]))
+        finally:
+            self._release()
+            self.finished = time.time()
+
+
+# Quitar los artículos repetidos (mismo contenido) y asignar los DOI del CSV
+def prepare_papers(papers, dois=None):
+    seen = set()
+    for paper in papers:
+        if dois and paper.doi is None:
+            paper.doi = dois.get(paper.name)
+        if paper.sha256 in seen:
+            paper.status = DUPLICATE
+        seen.add(paper.sha256)
+    return papers
+
+
+# Crear un lote y lanzarlo en segundo plano; devuelve el BatchRun para consultar su progreso
+def start_batch(papers, dois=None, args_dict=None, concurrency=CONCURRENCY, output_path=None, prompt_path="prompts.json"):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    run = BatchRun(prepare_papers(papers, dois), args_dict or backend.default_args(), concurrency, output_path, prompt_path)
+    with _runs_lock:
+        _prune()
+        _runs[run.id] = run
+    threading.Thread(target=run.run, name=f"solar-batch-{run.id[:8]}", daemon=True).start()
+    return run
+
+
+# Olvidar los lotes terminados hace más de FINISHED_KEEP_SECONDS (con _runs_lock tomado)
+def _prune():
+    now = time.time()
+    for batch_id in [batch_id for batch_id, run in _runs.items() if run.finished and now - run.finished > FINISHED_KEEP_SECONDS]:
+        del _runs[batch_id]
+
+
+def get_batch(batch_id):
+    with _runs_lock:
+        _prune()
+        return _runs.get(batch_id)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze many papers with the SolarChem backend.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or ZIP files")
+    parser.add_argument("--dois", help="CSV file with file name and DOI columns")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("-o", "--output", default="results.jsonl", help="consolidated JSONL output")
+    args = parser.parse_args()
+
+    papers = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(".pdf"):
+                    papers.append(paper_from_path(os.path.join(path, name)))
+        elif path.lower().endswith(".zip"):
+            papers.extend(papers_from_zip(path))
+        else:
+            papers.append(paper_from_path(path))
+    dois = None
+    if args.dois:
+        with open(args.dois, "rb") as f:
+            dois = read_dois(f)
+
+    run = start_batch(papers, dois, concurrency=args.concurrency, output_path=args.output)
+    while True:
+        progress = run.progress()
+        print(
+            f"\r{progress['completed']}/{progress['total']} papers "
+            f"({progress['failed']} failed, {progress['duplicate']} duplicates) "
+            f"{progress['papers_per_hour']:.1f} papers/h, ETA {format_seconds(progress['eta'])}",
+            end="", file=sys.stderr,
+        )
+        if progress["finished"]:
+            break
+        time.sleep(1)
+    print(file=sys.stderr)
+    for paper in run.papers:
+        if paper.status == FAILED:
+            print(f"{paper.name}: {paper.error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
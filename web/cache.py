@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+
+# Directorio de la caché de análisis y tamaño máximo antes de expulsar entradas (LRU)
+CACHE_DIR = os.environ.get("SOLAR_CACHE_DIR", os.path.join(".cache", "analysis"))
+CACHE_MAX_BYTES = int(float(os.environ.get("SOLAR_CACHE_MAX_MB", "500")) * 1024 * 1024)
+
+# Argumentos que no cambian el resultado del análisis y no forman parte de la clave
+_IGNORED_ARGS = ("input_file_path",)
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+# Hash SHA-256 del contenido de un PDF (acepta bytes o memoryview, sin copiar)
+def pdf_digest(pdf_buffer):
+    return hashlib.sha256(pdf_buffer).hexdigest()
+
+
+# Clave de caché: hash del PDF, de la configuración del pipeline y del contenido de prompts.json
+def cache_key(pdf_sha256, args_dict, prompt_path=None):
+    digest = hashlib.sha256()
+    digest.update(pdf_sha256.encode("ascii"))
+    config = {k: v for k, v in args_dict.items() if k not in _IGNORED_ARGS}
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    if prompt_path and os.path.exists(prompt_path):
+        with open(prompt_path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+# Resultado guardado para la clave, o None; a diferencia de get() no cuenta en las estadísticas
+def load(key):
+    path = _path(key)
+    try:
+        with open(path, "r") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Actualizar la fecha de acceso para la política LRU
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return result
+
+
+# Devolver el resultado guardado para la clave, o None si no está en caché
+def get(key):
+    result = load(key)
+    _count("misses" if result is None else "hits")
+    return result
+
+
+# Guardar un resultado y expulsar las entradas menos usadas si se supera el tamaño máximo
+def put(key, result):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(key)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+    _count("stores")
+    _evict()
+
+
+def _evict():
+    with _lock:
+        entries = []
+        total = 0
+        for entry in os.scandir(CACHE_DIR):
+            if not entry.name.endswith(".json"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            _stats["evictions"] += 1
+
+
+# Envolver una tarea de análisis para que guarde su resultado en la caché
+def cached(task, key):
+    def run(args_dict, report=None):
+        result = task(args_dict, report)
+        put(key, result)
+        return result
+    return run
+
+
+# Estadísticas de uso de la caché en este proceso
+def stats():
+    with _lock:
+        result = dict(_stats)
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+    return result
+
+
+# Vaciar la caché por completo
+def clear():
+    with _lock:
+        if not os.path.isdir(CACHE_DIR):
+            return
+        for entry in os.scandir(CACHE_DIR):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Tuple
+
+import records
+
+# Documentos de resultados ya leídos, compartidos por todas las sesiones del proceso. Se
+# identifican por el hash de su contenido y son inmutables (los votos van en cada sesión).
+# Se descartan los menos usados cuando se supera el número de documentos o el tamaño total
+# (el tamaño del fichero, que es aproximadamente lo que ocupa el documento en memoria).
+CACHE_ENTRIES = int(os.environ.get("SOLAR_DOC_CACHE_ENTRIES", "64"))
+CACHE_MAX_BYTES = int(float(os.environ.get("SOLAR_DOC_CACHE_MB", "256")) * 1024 * 1024)
+
+
+class LoadedDocument(NamedTuple):
+    document: records.Document
+    # Índice plano de evidencias [(analysis_idx, evidence_idx), ...] y posición de la primera
+    # evidencia de cada categoría
+    items: List[Tuple[int, int]]
+    category_start: Dict[int, int]
+    size: int
+
+
+_lock = threading.Lock()
+_documents = OrderedDict()
+_bytes = 0
+# Un cerrojo por documento que se está leyendo, para leerlo una sola vez aunque lo abran
+# varias sesiones a la vez
+_loading = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+# Votos en memoria del documento abierto en cada sesión (su overlay), para poder vaciar
+# también los de las sesiones que ya no vuelven a ejecutar el script
+_overlays = {}
+
+
+def _index(document):
+    items = []
+    category_start = {}
+    for analysis_idx, analysis in enumerate(document.result):
+        category_start[analysis_idx] = len(items)
+        items.extend((analysis_idx, evidence_idx) for evidence_idx in range(len(analysis.evidences)))
+    return items, category_start
+
+
+# Documento con hash digest si ya está en la caché (cuenta como acierto), o None
+def get(digest):
+    with _lock:
+        loaded = _documents.get(digest)
+        if loaded is not None:
+            _documents.move_to_end(digest)
+            _stats["hits"] += 1
+        return loaded
+
+
+def _put(digest, loaded):
+    global _bytes
+    with _lock:
+        if digest in _documents:
+            return
+        _documents[digest] = loaded
+        _bytes += loaded.size
+        # Siempre se conserva al menos el documento recién leído
+        while len(_documents) > 1 and (len(_documents) > CACHE_ENTRIES or _bytes > CACHE_MAX_BYTES):
+            _, evicted = _documents.popitem(last=False)
+            _bytes -= evicted.size
+            _stats["evictions"] += 1
+
+
+# Documento con hash digest; si no está en la caché se lee de stream (fichero binario o de
+# texto con el JSON de resultados) con records.load_document
+def load(digest, stream, size):
+    loaded = get(digest)
+    if loaded is not None:
+        return loaded
+
+    with _lock:
+        lock = _loading.setdefault(digest, threading.Lock())
+    try:
+        with lock:
+            loaded = get(digest)
+            if loaded is None:
+                document = records.load_document(stream)
+                loaded = LoadedDocument(document, *_index(document), size)
+                _put(digest, loaded)
+                with _lock:
+                    _stats["misses"] += 1
+    finally:
+        # También si el fichero no es válido: si no, el cerrojo se quedaría para siempre
+        with _lock:
+            _loading.pop(digest, None)
+    return loaded
+
+
+def stats():
+    with _lock:
+        return dict(_stats, entries=len(_documents), bytes=_bytes)
+
+
+def clear():
+    global _bytes
+    with _lock:
+        _documents.clear()
+        _bytes = 0
+
+
+# Registrar el overlay de una sesión; untrack_overlay lo quita al cerrar el documento
+def track_overlay(overlay):
+    with _lock:
+        _overlays[id(overlay)] = overlay
+
+
+def untrack_overlay(overlay):
+    with _lock:
+        _overlays.pop(id(overlay), None)
+
+
+# Vaciar los votos en memoria de los overlays sin actividad desde hace idle_seconds, de
+# cualquier sesión. El overlay conserva su documento y su última actividad, así que si la
+# sesión vuelve lo cierra y recupera los votos del registro de votos. Devuelve cuántos vació.
+def release_idle_overlays(idle_seconds):
+    now = time.time()
+    with _lock:
+        idle = [key for key, overlay in _overlays.items() if now - overlay["touched"] > idle_seconds]
+        for key in idle:
+            _overlays.pop(key)["votes"] = {}
+    return len(idle)
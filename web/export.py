@@ -0,0 +1,154 @@
+import argparse
+import csv
+import io
+import json
+import sys
+
+import records
+
+# Formatos de exportación: extensión y tipo MIME. "json" es el documento completo (anidado);
+# el resto tienen una fila por evidencia, pensados para la evaluación posterior.
+FORMATS = {
+    "json": ("json", "application/json"),
+    "jsonl": ("jsonl", "application/x-ndjson"),
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+ROW_FIELDS = [
+    "source", "paper_title", "DOI", "annotator", "category", "selected_answer",
+    "evidence_idx", "similarity_score", "vote", "pdf_reference", "generated_facts",
+]
+
+# Filas que se escriben juntas en cada grupo del fichero Parquet
+PARQUET_BATCH = 10000
+
+
+# Una fila por evidencia de un records.Document, con el voto si lo hay
+def evidence_rows(document, annotator_name="", votes=None, source=""):
+    votes = votes or {}
+    for analysis_idx, analysis in enumerate(document.result):
+        for evidence_idx, evidence in enumerate(analysis.evidences):
+            score = evidence.similarity_score
+            yield {
+                "source": source,
+                "paper_title": document.paper_title,
+                "DOI": document.DOI,
+                "annotator": annotator_name,
+                "category": analysis.question_category,
+                "selected_answer": analysis.selected_answer,
+                "evidence_idx": evidence_idx,
+                "similarity_score": float(score) if isinstance(score, (int, float)) else None,
+                "vote": votes.get((analysis_idx, evidence_idx)),
+                "pdf_reference": evidence.pdf_reference,
+                "generated_facts": evidence.generated_facts,
+            }
+
+
+def _write_parquet(rows, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (name, pa.int32() if name == "evidence_idx" else pa.float64() if name == "similarity_score" else pa.string())
+        for name in ROW_FIELDS
+    ])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch or not count:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+# Escribir filas de evidencias sin tenerlas todas en memoria. jsonl y csv escriben en un
+# fichero de texto; parquet en un fichero binario (requiere pyarrow). Devuelve el número de filas.
+def write_rows(rows, out, fmt="jsonl"):
+    if fmt == "parquet":
+        return _write_parquet(rows, out)
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=ROW_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif fmt == "jsonl":
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Formato de exportación no válido: {fmt}")
+    return count
+
+
+# Escribir varios documentos anidados como una lista JSON, uno cada vez
+def write_json_array(documents, out):
+    count = 0
+    out.write("[")
+    for document in documents:
+        out.write(",\n" if count else "\n")
+        out.write(json.dumps(document, indent=4))
+        count += 1
+    out.write("\n]\n" if count else "]\n")
+    return count
+
+
+# Fichero de exportación de un documento, generado solo cuando se pide. nested es el
+# documento anidado que se exporta en formato json (por defecto, records.to_transformed).
+def export_document(document, fmt, annotator_name="", votes=None, nested=None):
+    if fmt == "json":
+        if nested is None:
+            nested = records.to_transformed(document, annotator_name, votes)
+        return json.dumps(nested, indent=4).encode("utf-8")
+    rows = evidence_rows(document, annotator_name, votes)
+    if fmt == "parquet":
+        out = io.BytesIO()
+        write_rows(rows, out, fmt)
+        return out.getvalue()
+    out = io.StringIO(newline="")
+    write_rows(rows, out, fmt)
+    return out.getvalue().encode("utf-8")
+
+
+# Convertir un fichero JSONL de resultados (un documento por línea) a otro formato sin cargarlo
+# entero: la memoria usada no depende del número de documentos. Devuelve el número de filas
+# o de documentos escritos.
+def export_jsonl(input_path, output_path, fmt):
+    with open(input_path, encoding="utf-8") as stream:
+        documents = records.iter_documents(stream, raw=True)
+        if fmt == "json":
+            with open(output_path, "w", encoding="utf-8") as out:
+                return write_json_array((raw for raw, document in documents), out)
+        rows = (
+            row
+            for raw, document in documents
+            for row in evidence_rows(document, source=raw.get("file_name", ""))
+        )
+        if fmt == "parquet":
+            with open(output_path, "wb") as out:
+                return write_rows(rows, out, fmt)
+        with open(output_path, "w", encoding="utf-8", newline="") as out:
+            return write_rows(rows, out, fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert SolarChem analysis results (JSONL, one document per line) to another format.")
+    parser.add_argument("input", help="JSONL file, e.g. the output of batch.py")
+    parser.add_argument("output", help="output file")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    args = parser.parse_args()
+
+    count = export_jsonl(args.input, args.output, args.format)
+    print(f"{count} {'documents' if args.format == 'json' else 'evidences'} exported", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
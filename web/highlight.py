@@ -0,0 +1,325 @@
+import bisect
+import hashlib
+import json
+import os
+import pickle
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+# A partir de este número de páginas el índice se construye en varios procesos
+PARALLEL_MIN_PAGES = int(os.environ.get("SOLAR_HIGHLIGHT_PARALLEL_PAGES", "40"))
+MAX_WORKERS = int(os.environ.get("SOLAR_HIGHLIGHT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Número de índices de PDF que se guardan en memoria
+CACHE_ENTRIES = 16
+# Tamaño total de los PDFs resaltados que se guardan en memoria. De cada PDF solo se guarda el
+# último generado: cada cambio de voto da otro resultado y el anterior ya no se vuelve a pedir.
+OUTPUT_CACHE_BYTES = int(float(os.environ.get("SOLAR_HIGHLIGHT_CACHE_MB", "128")) * 1024 * 1024)
+# Si la referencia completa no aparece, se buscan su principio y su final con este número de palabras
+ANCHOR_WORDS = 8
+# El final se busca como mucho a ANCHOR_SPAN veces la longitud de la referencia desde el principio
+ANCHOR_SPAN = 2
+
+# Colores RGB por categoría; las categorías desconocidas usan el color por defecto
+CATEGORY_COLORS = {
+    "catalyst": (1.0, 0.85, 0.0),
+    "co_catalyst": (1.0, 0.6, 0.2),
+    "light_source": (0.4, 0.8, 1.0),
+    "lamp": (0.55, 0.55, 1.0),
+    "reaction_medium": (0.5, 0.9, 0.5),
+    "reactor_type": (1.0, 0.55, 0.8),
+    "operation_mode": (0.75, 0.6, 0.45),
+}
+DEFAULT_COLOR = (1.0, 1.0, 0.4)
+DOWNVOTE_COLOR = (0.75, 0.75, 0.75)
+
+_WORD = re.compile(r"\w+")
+
+_lock = threading.Lock()
+_indexes = OrderedDict()
+# digest del PDF -> (spec de las evidencias, resultado)
+_outputs = OrderedDict()
+_outputs_bytes = 0
+# Procesos para indexar, compartidos por todo el proceso: cada hilo de _pool arranca (al
+# primer uso) su propio proceso, que ejecuta este fichero y recibe las tareas por stdin.
+# No se usa multiprocessing: con "fork" el proceso hijo hereda los hilos en marcha del
+# servidor de Streamlit (trabajos, registro de votos) y puede quedarse bloqueado, y con
+# "spawn" los hijos vuelven a ejecutar el __main__ del servidor, que es el script de la app.
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="solar-highlight")
+_workers = threading.local()
+
+
+# Normalizar un texto a una lista de palabras en minúsculas, sin puntuación
+def normalize_words(text):
+    return _WORD.findall(text.replace("-\n", "").lower())
+
+
+# Índice de un rango de páginas: palabras normalizadas con su página y su rectángulo
+def _index_pages(doc, first_page, last_page):
+    words = []
+    locations = []
+    for page_number in range(first_page, last_page):
+        for x0, y0, x1, y1, text, *_ in doc[page_number].get_text("words"):
+            for word in normalize_words(text):
+                words.append(word)
+                locations.append((page_number, x0, y0, x1, y1))
+    return words, locations
+
+
+# Tarea de los procesos del pool: indexar un rango de páginas del PDF guardado en path
+def _index_file_pages(path, first_page, last_page):
+    with fitz.open(path) as doc:
+        return _index_pages(doc, first_page, last_page)
+
+
+# Proceso del hilo actual y el fichero por el que devuelve los resultados; se arranca de nuevo
+# si no existe o ha terminado
+def _worker():
+    process = getattr(_workers, "process", None)
+    if process is None or process.poll() is not None:
+        # Los resultados van por una tubería propia: PyMuPDF puede escribir avisos en stdout
+        read_fd, write_fd = os.pipe()
+        try:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), str(write_fd)],
+                stdin=subprocess.PIPE,
+                pass_fds=(write_fd,),
+            )
+        except OSError:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        _workers.process = process
+        _workers.results = os.fdopen(read_fd, "rb")
+    return process, _workers.results
+
+
+# Indexar un rango de páginas en el proceso del hilo actual
+def _index_in_worker(path, first_page, last_page):
+    process, results = _worker()
+    try:
+        pickle.dump((path, first_page, last_page), process.stdin)
+        process.stdin.flush()
+        return pickle.load(results)
+    except Exception:
+        # El proceso murió o la conexión quedó a medias: la siguiente tarea arranca otro
+        _workers.process = None
+        process.kill()
+        process.wait()
+        process.stdin.close()
+        results.close()
+        raise
+
+
+# Bucle de los procesos del pool (python highlight.py FD): una tarea (path, primera página,
+# última página) por stdin y su resultado por el descriptor FD, hasta que se cierra stdin
+def _serve(results_fd):
+    tasks = sys.stdin.buffer
+    with os.fdopen(results_fd, "wb") as results:
+        while True:
+            try:
+                path, first_page, last_page = pickle.load(tasks)
+            except EOFError:
+                return
+            pickle.dump(_index_file_pages(path, first_page, last_page), results)
+            results.flush()
+
+
+class PdfIndex:
+    """Texto normalizado de todo el PDF con la posición de cada palabra."""
+
+    def __init__(self, words, locations):
+        self.locations = locations
+        self.starts = []
+        # Con un espacio al principio y al final, " palabras " solo coincide con palabras enteras
+        offset = 1
+        for word in words:
+            self.starts.append(offset)
+            offset += len(word) + 1
+        self.text = " " + " ".join(words) + " "
+
+    def _word_at(self, offset):
+        return bisect.bisect_right(self.starts, offset) - 1
+
+    # Primera palabra de la primera aparición de words entre los caracteres start y end, o -1
+    def _search(self, words, start=0, end=None):
+        offset = self.text.find(" " + " ".join(words) + " ", start, len(self.text) if end is None else end)
+        if offset < 0:
+            return -1
+        return self._word_at(offset + 1)
+
+    # Devolver el rango de palabras [primera, última] donde aparece la referencia, o None
+    def find(self, reference):
+        words = normalize_words(reference)
+        if not words:
+            return None
+        first = self._search(words)
+        if first >= 0:
+            return first, first + len(words) - 1
+
+        # El texto extraído por el backend puede diferir del PDF: buscar principio y final
+        first = self._search(words[:ANCHOR_WORDS])
+        if first < 0:
+            return None
+        if len(words) > ANCHOR_WORDS:
+            # El final tiene que estar cerca del principio y no, por ejemplo, en la bibliografía
+            head = self.starts[first]
+            end = head + ANCHOR_SPAN * (len(" ".join(words)) + 2)
+            tail = self._search(words[-ANCHOR_WORDS:], head - 1, end)
+            if tail >= 0:
+                return first, tail + ANCHOR_WORDS - 1
+        return first, min(first + len(words), len(self.locations)) - 1
+
+
+# Construir el índice del PDF, en paralelo por bloques de páginas si el PDF es largo. El PDF
+# se escribe una vez en un fichero temporal y cada proceso recibe solo su rango de páginas.
+def build_index(pdf_bytes):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES or MAX_WORKERS < 2:
+            return PdfIndex(*_index_pages(doc, 0, page_count))
+
+    step = -(-page_count // MAX_WORKERS)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    words = []
+    locations = []
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        pdf_file.write(pdf_bytes)
+        pdf_file.flush()
+        futures = [_pool.submit(_index_in_worker, pdf_file.name, first, last) for first, last in ranges]
+        try:
+            for future in futures:
+                part_words, part_locations = future.result()
+                words.extend(part_words)
+                locations.extend(part_locations)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            # Un proceso murió: este PDF se indexa aquí
+            print(f"Error indexing the PDF in parallel: {e!r}", file=sys.stderr)
+            for future in futures:
+                future.cancel()
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                return PdfIndex(*_index_pages(doc, 0, page_count))
+    return PdfIndex(words, locations)
+
+
+def _cache_get(cache, key):
+    with _lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
+
+
+def _cache_put(cache, key, value):
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+
+# Índice del PDF, guardado en caché por el hash de su contenido
+def get_index(pdf_bytes, digest=None):
+    digest = digest or hashlib.sha256(pdf_bytes).hexdigest()
+    index = _cache_get(_indexes, digest)
+    if index is None:
+        index = build_index(pdf_bytes)
+        _cache_put(_indexes, digest, index)
+    return index
+
+
+def _color(category, vote):
+    if vote == "0":
+        return DOWNVOTE_COLOR
+    return CATEGORY_COLORS.get(category.replace(" ", "_").replace("-", "_").lower(), DEFAULT_COLOR)
+
+
+# Rectángulos por página de un rango de palabras, uniendo las palabras de una misma línea
+def _rects_by_page(locations):
+    pages = {}
+    for page_number, x0, y0, x1, y1 in locations:
+        rects = pages.setdefault(page_number, [])
+        if rects and abs(rects[-1].y0 - y0) < 1 and abs(rects[-1].y1 - y1) < 1 and x0 >= rects[-1].x0:
+            rects[-1].x1 = max(rects[-1].x1, x1)
+        else:
+            rects.append(fitz.Rect(x0, y0, x1, y1))
+    return pages
+
+
+def _spec(evidences):
+    return hashlib.sha256(json.dumps(evidences, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _output_get(digest, spec):
+    with _lock:
+        entry = _outputs.get(digest)
+        if entry is None or entry[0] != spec:
+            return None
+        _outputs.move_to_end(digest)
+        return entry[1]
+
+
+def _output_put(digest, spec, output):
+    global _outputs_bytes
+    with _lock:
+        previous = _outputs.pop(digest, None)
+        if previous is not None:
+            _outputs_bytes -= len(previous[1][0])
+        _outputs[digest] = (spec, output)
+        _outputs_bytes += len(output[0])
+        # Siempre se conserva al menos el PDF recién generado
+        while len(_outputs) > 1 and _outputs_bytes > OUTPUT_CACHE_BYTES:
+            _, (_, evicted) = _outputs.popitem(last=False)
+            _outputs_bytes -= len(evicted[0])
+
+
+# PDF resaltado ya generado para este PDF y estas evidencias, o None
+def cached_highlight(digest, evidences):
+    return _output_get(digest, _spec(evidences))
+
+
+# Generar el PDF resaltado. evidences: lista de {"category", "pdf_reference", "vote"}.
+# Devuelve (bytes del PDF, número de evidencias encontradas, referencias no encontradas).
+def highlight_pdf(pdf_bytes, evidences, digest=None):
+    digest = digest or hashlib.sha256(pdf_bytes).hexdigest()
+    spec = _spec(evidences)
+    cached = _output_get(digest, spec)
+    if cached is not None:
+        return cached
+
+    index = get_index(pdf_bytes, digest)
+    found = 0
+    missing = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for evidence in evidences:
+            category = evidence.get("category", "Unknown Category")
+            vote = evidence.get("vote")
+            span = index.find(evidence.get("pdf_reference") or "")
+            if span is None:
+                missing.append(evidence.get("pdf_reference"))
+                continue
+            found += 1
+            first, last = span
+            for page_number, rects in _rects_by_page(index.locations[first:last + 1]).items():
+                # La anotación solo sigue unida a la página mientras exista la referencia a esta
+                page = doc[page_number]
+                annot = page.add_highlight_annot(rects)
+                annot.set_colors(stroke=_color(category, vote))
+                annot.set_opacity(0.35 if vote is None else 0.6)
+                annot.set_info(title=category, content=f"vote: {vote}" if vote is not None else "not voted")
+                annot.update()
+        output = (doc.tobytes(garbage=3, deflate=True), found, missing)
+
+    _output_put(digest, spec, output)
+    return output
+
+
+if __name__ == "__main__":
+    _serve(int(sys.argv[1]))
@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cache
+import metrics
+from backend import BackendError
+
+# Base de datos local donde se guardan el estado y el resultado de cada trabajo
+JOBS_DB = os.environ.get("SOLAR_JOBS_DB", "jobs.db")
+# Número máximo de análisis ejecutándose a la vez en este proceso
+MAX_WORKERS = int(os.environ.get("SOLAR_JOB_WORKERS", "2"))
+# Los trabajos terminados se borran cuando llevan más de KEEP_SECONDS sin cambios
+KEEP_SECONDS = float(os.environ.get("SOLAR_JOBS_KEEP_SECONDS", str(7 * 24 * 3600)))
+# Segundos entre consultas del estado de un trabajo en curso desde la página
+POLL_SECONDS = 1
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_lock = threading.Lock()
+_executor = None
+_initialized = False
+
+
+def _connect():
+    conn = sqlite3.connect(JOBS_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+# Crear la tabla y marcar como fallidos los trabajos que murieron con el proceso anterior
+def _init_db():
+    global _initialized
+    with _lock:
+        if _initialized:
+            return
+        with _connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                       id TEXT PRIMARY KEY,
+                       status TEXT NOT NULL,
+                       args TEXT NOT NULL,
+                       result TEXT,
+                       cache_key TEXT,
+                       overrides TEXT,
+                       error TEXT,
+                       created REAL NOT NULL,
+                       updated REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)")
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE status IN (?, ?)",
+                (FAILED, "The analysis was interrupted by a server restart. Please submit it again.",
+                 time.time(), PENDING, RUNNING),
+            )
+        _initialized = True
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="solar-job")
+        return _executor
+
+
+def _update(job_id, **fields):
+    fields["updated"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _run(job_id, task, args_dict, overrides):
+    _update(job_id, status=RUNNING)
+
+    # Guardar los resultados parciales para que la página los muestre mientras llegan
+    def report(partial):
+        _update(job_id, result=json.dumps(partial))
+
+    started = time.perf_counter()
+    status = FAILED
+    try:
+        result = task(args_dict, report)
+        if overrides:
+            result.update(overrides)
+        _update(job_id, status=DONE, result=json.dumps(result))
+        status = DONE
+    except BackendError as e:
+        _update(job_id, status=FAILED, error=str(e))
+    except Exception as e:
+        _update(job_id, status=FAILED, error=f"Error inesperado: {e}")
+    metrics.observe("solar_job_seconds", time.perf_counter() - started, status=status)
+
+
+# Borrar los trabajos terminados que llevan más de KEEP_SECONDS sin cambios
+def _prune(conn, now):
+    conn.execute(
+        "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?",
+        (DONE, FAILED, now - KEEP_SECONDS),
+    )
+
+
+# Registrar un trabajo y lanzarlo en segundo plano; devuelve su id inmediatamente
+def submit_job(args_dict, task, overrides=None):
+    _init_db()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _connect() as conn:
+        _prune(conn, now)
+        conn.execute(
+            "INSERT INTO jobs (id, status, args, created, updated) VALUES (?, ?, ?, ?, ?)",
+            (job_id, PENDING, json.dumps(args_dict), now, now),
+        )
+    _get_executor().submit(_run, job_id, task, args_dict, overrides)
+    return job_id
+
+
+# Registrar un trabajo ya terminado cuyo resultado está en la caché de análisis con la clave
+# cache_key. Solo se guarda la clave: el resultado se lee de la caché al consultar el trabajo.
+def store_job(args_dict, cache_key, overrides=None):
+    _init_db()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _connect() as conn:
+        _prune(conn, now)
+        conn.execute(
+            "INSERT INTO jobs (id, status, args, cache_key, overrides, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, DONE, json.dumps(args_dict), cache_key, json.dumps(overrides) if overrides else None, now, now),
+        )
+    return job_id
+
+
+# Consultar un trabajo; devuelve None si no existe
+def get_job(job_id):
+    _init_db()
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["args"] = json.loads(job["args"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    if job["cache_key"] and job["result"] is None:
+        job["result"] = cache.load(job["cache_key"])
+        if job["result"] is None:
+            job["status"] = FAILED
+            job["error"] = "The stored result of this analysis is no longer available. Please submit your paper again."
+        elif job["overrides"]:
+            job["result"].update(json.loads(job["overrides"]))
+    return job
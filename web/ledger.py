@@ -0,0 +1,191 @@
+import argparse
+import atexit
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Base de datos local con todos los votos emitidos
+VOTES_DB = os.environ.get("SOLAR_VOTES_DB", "votes.db")
+# Los votos se acumulan en memoria y se escriben en bloque cada FLUSH_SECONDS
+# o en cuanto hay FLUSH_BATCH votos pendientes
+FLUSH_SECONDS = float(os.environ.get("SOLAR_VOTES_FLUSH_SECONDS", "1"))
+FLUSH_BATCH = 200
+
+EXPORT_FIELDS = ["document", "paper_id", "category", "evidence_idx", "annotator", "vote", "updated"]
+
+_condition = threading.Condition()
+# Serializa las escrituras para que una lectura nunca adelante a un bloque en curso
+_write_lock = threading.Lock()
+_pending = {}
+_writer = None
+_initialized = False
+
+
+def _connect():
+    conn = sqlite3.connect(VOTES_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _init_db():
+    global _initialized
+    if _initialized:
+        return
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Los votos se guardan por fichero de resultados (hash SHA-256 de su contenido): otro
+        # análisis del mismo artículo tiene otras evidencias en las mismas posiciones. El DOI
+        # (paper_id) solo se guarda para exportar.
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS votes (
+                   document TEXT NOT NULL,
+                   paper_id TEXT NOT NULL,
+                   category TEXT NOT NULL,
+                   evidence_idx INTEGER NOT NULL,
+                   annotator TEXT NOT NULL,
+                   vote TEXT NOT NULL,
+                   updated REAL NOT NULL,
+                   PRIMARY KEY (document, category, evidence_idx, annotator)
+               )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS votes_paper ON votes (paper_id)")
+    _initialized = True
+
+
+# Escribir en la base de datos todos los votos pendientes en una sola transacción. Los votos
+# solo dejan de estar pendientes cuando el bloque se ha guardado: si la escritura falla se
+# intentan otra vez en el siguiente bloque.
+def flush():
+    with _write_lock:
+        with _condition:
+            _init_db()
+            if not _pending:
+                return
+            batch = dict(_pending)
+        rows = [
+            (document, paper_id, category, evidence_idx, annotator, vote, updated)
+            for (document, category, evidence_idx, annotator), (paper_id, vote, updated) in batch.items()
+        ]
+        with _connect() as conn:
+            conn.executemany(
+                """INSERT INTO votes (document, paper_id, category, evidence_idx, annotator, vote, updated)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (document, category, evidence_idx, annotator)
+                   DO UPDATE SET paper_id = excluded.paper_id, vote = excluded.vote, updated = excluded.updated""",
+                rows,
+            )
+        with _condition:
+            # Un voto posterior sobre la misma evidencia sigue pendiente
+            for key, value in batch.items():
+                if _pending.get(key) is value:
+                    del _pending[key]
+
+
+def _write_loop():
+    while True:
+        with _condition:
+            _condition.wait_for(lambda: len(_pending) >= FLUSH_BATCH, timeout=FLUSH_SECONDS)
+        try:
+            flush()
+        except sqlite3.Error as e:
+            print(f"Error writing votes: {e}", file=sys.stderr)
+            # Esperar antes de reintentar: con FLUSH_BATCH votos pendientes wait_for no espera
+            time.sleep(FLUSH_SECONDS)
+
+
+def _start_writer():
+    global _writer
+    if _writer is None:
+        _writer = threading.Thread(target=_write_loop, name="solar-votes", daemon=True)
+        _writer.start()
+        atexit.register(flush)
+
+
+# Registrar un voto ("1" o "0") sobre una evidencia del fichero de resultados con hash document.
+# No espera al disco: el voto se guarda en el siguiente bloque.
+def record_vote(document, paper_id, category, evidence_idx, annotator, vote):
+    with _condition:
+        _start_writer()
+        _pending[(document, category, evidence_idx, annotator)] = (paper_id, vote, time.time())
+        if len(_pending) >= FLUSH_BATCH:
+            _condition.notify()
+
+
+# Votos de un anotador para un fichero de resultados: {(category, evidence_idx): vote}
+# Incluye los votos que aún no se han podido escribir.
+def load_votes(document, annotator):
+    try:
+        flush()
+    except sqlite3.Error as e:
+        print(f"Error writing votes: {e}", file=sys.stderr)
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT category, evidence_idx, vote FROM votes WHERE document = ? AND annotator = ?",
+            (document, annotator),
+        ).fetchall()
+    votes = {(row["category"], row["evidence_idx"]): row["vote"] for row in rows}
+    with _condition:
+        for (pending_document, category, evidence_idx, pending_annotator), (_, vote, _) in _pending.items():
+            if pending_document == document and pending_annotator == annotator:
+                votes[(category, evidence_idx)] = vote
+    return votes
+
+
+# Recorrer todos los votos guardados, opcionalmente filtrados por artículo (DOI) o anotador
+def iter_votes(paper_id=None, annotator=None):
+    flush()
+    query = "SELECT * FROM votes"
+    conditions = []
+    params = []
+    if paper_id is not None:
+        conditions.append("paper_id = ?")
+        params.append(paper_id)
+    if annotator is not None:
+        conditions.append("annotator = ?")
+        params.append(annotator)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY paper_id, document, category, evidence_idx, annotator"
+    with _connect() as conn:
+        for row in conn.execute(query, params):
+            yield dict(row)
+
+
+# Exportar los votos a un fichero JSONL o CSV; devuelve el número de votos exportados
+def export_votes(out, fmt="jsonl", paper_id=None, annotator=None):
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in iter_votes(paper_id, annotator):
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in iter_votes(paper_id, annotator):
+            out.write(json.dumps(row) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the votes stored in the SolarChem vote ledger.")
+    parser.add_argument("output", help="output file, or - for standard output")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--paper", help="only export the votes of this paper (DOI)")
+    parser.add_argument("--annotator", help="only export the votes of this annotator")
+    args = parser.parse_args()
+
+    if args.output == "-":
+        count = export_votes(sys.stdout, args.format, args.paper, args.annotator)
+    else:
+        with open(args.output, "w", newline="") as out:
+            count = export_votes(out, args.format, args.paper, args.annotator)
+    print(f"{count} votes exported", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
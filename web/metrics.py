@@ -0,0 +1,241 @@
+import atexit
+import bisect
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Métricas del proceso de la interfaz (tiempos por etapa, latencia del backend, reruns,
+# sesiones y caché) en formato de texto de Prometheus. Desactivadas por defecto: con
+# SOLAR_METRICS=0 span() devuelve un contexto vacío compartido y observe() no hace nada.
+ENABLED = os.environ.get("SOLAR_METRICS", "0") == "1"
+# Servir /metrics en este puerto y/o escribir las métricas en este fichero cada METRICS_INTERVAL
+METRICS_PORT = int(os.environ.get("SOLAR_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("SOLAR_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("SOLAR_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.environ.get("SOLAR_METRICS_INTERVAL", "15"))
+
+# Límites (segundos) de los intervalos de los histogramas
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+HELP = {
+    "solar_stage_seconds": "Time spent in each stage of a script run or background task",
+    "solar_rerun_seconds": "Total time of each Streamlit script run",
+    "solar_backend_request_seconds": "Latency of each HTTP request to the analysis backend",
+    "solar_analysis_seconds": "Duration of complete /analysis/ calls",
+    "solar_job_seconds": "Duration of background analysis jobs",
+}
+
+_NOOP = contextlib.nullcontext()
+_lock = threading.Lock()
+_histograms = {}
+_gauges = {}
+_sessions = {}
+_local = threading.local()
+_started = False
+
+
+class Histogram:
+    """Histograma acumulado por combinación de etiquetas (intervalos, suma y número de valores)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    # Valor aproximado del percentil q (0-1) a partir de los intervalos
+    def quantile(self, labels, q):
+        series = self.series.get(labels)
+        if not series or not series[2]:
+            return None
+        target = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets, series[0]):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(key, seconds)
+
+
+@contextlib.contextmanager
+def _span(stage, labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe("solar_stage_seconds", elapsed, stage=stage, **labels)
+        spans = getattr(_local, "spans", None)
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+# Medir una etapa: with metrics.span("parse_json"): ...
+def span(stage, **labels):
+    if not ENABLED:
+        return _NOOP
+    return _span(stage, labels)
+
+
+# Empezar y terminar la medición de un rerun en el hilo actual. end_run devuelve las
+# etapas medidas durante el rerun [(etapa, segundos), ...] y registra el total.
+def begin_run():
+    if ENABLED:
+        _local.spans = []
+
+
+def end_run(seconds, **labels):
+    observe("solar_rerun_seconds", seconds, **labels)
+    spans = getattr(_local, "spans", None)
+    _local.spans = None
+    return spans or []
+
+
+# Valor que se calcula al exportar las métricas (por ejemplo, estadísticas de la caché)
+def register_gauge(name, function, help_text="", kind="gauge"):
+    with _lock:
+        _gauges[name] = (function, help_text, kind)
+
+
+# Marcar una sesión como activa; solar_active_sessions cuenta las vistas en los últimos idle_seconds
+def touch_session(session_id):
+    if ENABLED:
+        _sessions[session_id] = time.monotonic()
+
+
+def active_sessions(idle_seconds=300):
+    now = time.monotonic()
+    for session_id, seen in list(_sessions.items()):
+        if now - seen > idle_seconds:
+            _sessions.pop(session_id, None)
+    return len(_sessions)
+
+
+def histogram_summary(name):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            return []
+        return [
+            {
+                "labels": dict(labels),
+                "count": count,
+                "mean": total / count if count else 0.0,
+                "p50": histogram.quantile(labels, 0.5),
+                "p95": histogram.quantile(labels, 0.95),
+            }
+            for labels, (_, total, count) in sorted(histogram.series.items())
+        ]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+# Todas las métricas en formato de texto de Prometheus
+def render():
+    lines = []
+    with _lock:
+        for name, histogram in sorted(_histograms.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, (counts, total, count) in sorted(histogram.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        gauges = dict(_gauges)
+    gauges.setdefault("solar_active_sessions", (active_sessions, "Sessions with a script run in the last 5 minutes", "gauge"))
+    for name, (function, help_text, kind) in sorted(gauges.items()):
+        try:
+            value = function()
+        except Exception:
+            continue
+        lines.append(f"# HELP {name} {help_text or name}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_file(path=None):
+    path = path or METRICS_FILE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as out:
+        out.write(render())
+    os.replace(tmp_path, path)
+
+
+def _write_periodically():
+    while True:
+        time.sleep(METRICS_INTERVAL)
+        try:
+            write_file()
+        except OSError:
+            pass
+
+
+# Arrancar los exportadores configurados (una sola vez por proceso)
+def start():
+    global _started
+    with _lock:
+        if _started or not ENABLED:
+            return
+        _started = True
+    if METRICS_PORT:
+        server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _Handler)
+        threading.Thread(target=server.serve_forever, name="solar-metrics-http", daemon=True).start()
+    if METRICS_FILE:
+        threading.Thread(target=_write_periodically, name="solar-metrics-file", daemon=True).start()
+        atexit.register(write_file)
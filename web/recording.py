@@ -0,0 +1,80 @@
+import datetime
+import hashlib
+import itertools
+import json
+import threading
+
+# Grabación del tráfico con el backend de análisis en JSONL (una llamada por línea) y lectura
+# de las grabaciones para reproducirlas con stub_backend.py. Cada línea contiene:
+#   path, mode ("stream" o "blocking"), args (args_dict enviado), seconds (duración total),
+#   offsets (segundos hasta la llegada de cada categoría, en modo stream), status y error
+#   (si falló) y response (resultado del análisis)
+
+# Datos que no cambian el resultado del análisis y no cuentan al buscar una grabación
+_IGNORED_ARGS = {"input_file_path"}
+
+_write_lock = threading.Lock()
+
+
+# Clave de una petición para encontrar su grabación
+def request_key(args_dict):
+    config = {k: v for k, v in args_dict.items() if k not in _IGNORED_ARGS}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def record(path, entry):
+    entry = dict(entry, recorded=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"))
+    line = json.dumps(entry) + "\n"
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as out:
+            out.write(line)
+
+
+def load(path):
+    entries = []
+    with open(path, encoding="utf-8") as stream:
+        for line in stream:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+class Replayer:
+    """Respuestas grabadas. Una petición recibe la grabación de los mismos argumentos si la
+    hay y, si no, la siguiente de la lista (en orden y de forma cíclica), para que el
+    resultado sea determinista con cualquier PDF."""
+
+    def __init__(self, entries):
+        if not entries:
+            raise ValueError("La grabación no contiene ninguna llamada")
+        self.entries = entries
+        self.by_key = {}
+        for entry in entries:
+            self.by_key.setdefault(request_key(entry.get("args", {})), []).append(entry)
+        self._cycle = itertools.cycle(entries)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load(path))
+
+    def lookup(self, args_dict):
+        matches = self.by_key.get(request_key(args_dict))
+        with self._lock:
+            if matches:
+                # Varias grabaciones de la misma petición se devuelven por turnos
+                matches.append(matches.pop(0))
+                return matches[-1]
+            return next(self._cycle)
+
+
+# Segundos (desde el inicio) en que se envía cada categoría al reproducir en modo stream:
+# los grabados o, si la grabación no los tiene, repartidos de forma uniforme
+def category_offsets(entry, latency_scale=1.0):
+    result = (entry.get("response") or {}).get("result", [])
+    offsets = entry.get("offsets")
+    if not offsets or len(offsets) != len(result):
+        step = entry.get("seconds", 0) / max(len(result), 1)
+        offsets = [step * (idx + 1) for idx in range(len(result))]
+    return [offset * latency_scale for offset in offsets]
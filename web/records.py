@@ -0,0 +1,285 @@
+import codecs
+import json
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+# Registros compactos (tuplas con nombre) para los ficheros de resultados del análisis y un
+# lector incremental que no necesita cargar el fichero entero en memoria.
+
+NOT_AVAILABLE = "Not available"
+UNKNOWN_CATEGORY = "Unknown Category"
+
+# Campos del documento que se copian tal cual al documento transformado
+DOCUMENT_FIELDS = ("paper_title", "DOI", "generation_model", "similarity_model", "similarity_metric", "rag_type")
+
+READ_CHUNK = 1024 * 1024
+
+
+class Evidence(NamedTuple):
+    pdf_reference: str
+    generated_facts: str
+    similarity_score: Optional[float]
+
+
+class Analysis(NamedTuple):
+    question_category: str
+    query: str
+    generation: str
+    RAG_source: str
+    ground_truth: str
+    selected_answer: str
+    evidences: List[Evidence]
+
+
+class Document(NamedTuple):
+    paper_title: str
+    DOI: str
+    generation_model: str
+    similarity_model: str
+    similarity_metric: str
+    rag_type: str
+    result: List[Analysis]
+
+
+# Categoría normalizada tal como aparece en las claves de selected_answer
+@lru_cache(maxsize=256)
+def normalize_category(question_category):
+    return question_category.replace(" ", "_").lower()
+
+
+# Claves de selected_answer en minúsculas, calculadas una vez por conjunto de claves
+@lru_cache(maxsize=256)
+def _lower_keys(keys):
+    return tuple(key.lower() for key in keys)
+
+
+# Respuesta de la categoría: la primera clave que contiene el nombre normalizado de la categoría
+def select_answer(question_category, selected_answer_dict):
+    if not selected_answer_dict:
+        return NOT_AVAILABLE
+    category = normalize_category(question_category)
+    keys = tuple(selected_answer_dict)
+    for key, lower_key in zip(keys, _lower_keys(keys)):
+        if category in lower_key:
+            return f"{key}: {selected_answer_dict[key].strip()}"
+    return NOT_AVAILABLE
+
+
+# Los registros se crean con tuple.__new__, bastante más rápido que el constructor de NamedTuple
+_new = tuple.__new__
+
+
+def parse_evidences(raw_evidences):
+    return [
+        _new(Evidence, (evidence.get("pdf_reference", NOT_AVAILABLE), evidence.get("generated_facts", NOT_AVAILABLE), evidence.get("similarity_score")))
+        for evidence in raw_evidences
+    ]
+
+
+def parse_analysis(raw):
+    get = raw.get
+    question_category = get("question_category", UNKNOWN_CATEGORY)
+    return _new(Analysis, (
+        question_category,
+        get("query", NOT_AVAILABLE),
+        get("generation", NOT_AVAILABLE),
+        get("RAG_source", NOT_AVAILABLE),
+        get("ground_truth", NOT_AVAILABLE),
+        select_answer(question_category, get("selected_answer")),
+        parse_evidences(get("evidences", ())),
+    ))
+
+
+def _document(fields, analyses):
+    return _new(Document, (*(fields.get(name, NOT_AVAILABLE) for name in DOCUMENT_FIELDS), analyses))
+
+
+# Documento ya cargado (dict) -> Document
+def parse_document(raw):
+    return _document(raw, [parse_analysis(analysis) for analysis in raw.get("result", ())])
+
+
+# Documento en el formato de "Download JSON". Si se indican votos ({(analysis_idx,
+# evidence_idx): "1" o "0"}) se añaden a las evidencias votadas.
+def to_transformed(document, annotator_name, votes=None):
+    votes = votes or {}
+    result = []
+    for analysis_idx, analysis in enumerate(document.result):
+        evidences = []
+        for evidence_idx, (pdf_reference, generated_facts, similarity_score) in enumerate(analysis.evidences):
+            evidence = {"pdf_reference": pdf_reference, "generated_facts": generated_facts, "similarity_score": similarity_score}
+            vote = votes.get((analysis_idx, evidence_idx))
+            if vote in ("0", "1"):
+                evidence["vote"] = vote
+            evidences.append(evidence)
+        result.append({
+            "question_category": analysis.question_category,
+            "query": analysis.query,
+            "generation": analysis.generation,
+            "RAG_source": analysis.RAG_source,
+            "ground_truth": analysis.ground_truth,
+            "selected_answer": analysis.selected_answer,
+            "evidences": evidences,
+        })
+    return {
+        "paper_title": document.paper_title,
+        "DOI": document.DOI,
+        "annotator_name": annotator_name,
+        "generation_model": document.generation_model,
+        "similarity_model": document.similarity_model,
+        "similarity_metric": document.similarity_metric,
+        "rag_type": document.rag_type,
+        "result": result,
+    }
+
+
+# Transformar JSON (documento ya cargado) directamente al formato de "Download JSON"
+def transform_json(input_json, annotator_name):
+    get = input_json.get
+    return {
+        "paper_title": get("paper_title", NOT_AVAILABLE),
+        "DOI": get("DOI", NOT_AVAILABLE),
+        "annotator_name": annotator_name,
+        "generation_model": get("generation_model", NOT_AVAILABLE),
+        "similarity_model": get("similarity_model", NOT_AVAILABLE),
+        "similarity_metric": get("similarity_metric", NOT_AVAILABLE),
+        "rag_type": get("rag_type", NOT_AVAILABLE),
+        "result": [_transform_analysis(analysis) for analysis in get("result", ())],
+    }
+
+
+def _transform_analysis(raw):
+    get = raw.get
+    question_category = get("question_category", UNKNOWN_CATEGORY)
+    return {
+        "question_category": question_category,
+        "query": get("query", NOT_AVAILABLE),
+        "generation": get("generation", NOT_AVAILABLE),
+        "RAG_source": get("RAG_source", NOT_AVAILABLE),
+        "ground_truth": get("ground_truth", NOT_AVAILABLE),
+        "selected_answer": select_answer(question_category, get("selected_answer")),
+        "evidences": [
+            {
+                "pdf_reference": evidence.get("pdf_reference", NOT_AVAILABLE),
+                "generated_facts": evidence.get("generated_facts", NOT_AVAILABLE),
+                "similarity_score": evidence.get("similarity_score"),
+            }
+            for evidence in get("evidences", ())
+        ],
+    }
+
+
+class _Reader:
+    """Lee un JSON por trozos y decodifica valores completos con raw_decode."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.json = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        # Leer trozos cada vez mayores si un valor no cabe, para no decodificarlo demasiadas veces
+        chunk = self.stream.read(max(READ_CHUNK, len(self.buffer) - self.pos))
+        if isinstance(chunk, bytes):
+            text = self.decoder.decode(chunk, final=not chunk)
+        else:
+            text = chunk
+        if not chunk:
+            self.eof = True
+        # Descartar lo ya consumido para que la memoria no crezca con el fichero
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    # Siguiente carácter que no sea espacio (sin consumirlo); "" al final del fichero
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Invalid JSON: expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    # Decodificar el siguiente valor completo, leyendo más datos mientras esté incompleto
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Un número al final del buffer podría continuar en el siguiente trozo
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+# Recorrer un documento de resultados sin cargarlo entero: devuelve un generador de
+# ("field", nombre, valor) para los datos del documento y ("analysis", índice, Analysis)
+# para cada categoría, en el orden del fichero
+def iter_events(stream):
+    reader = _Reader(stream)
+    reader.expect("{")
+    if reader.peek() != "}":
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "result" and reader.peek() == "[":
+                reader.expect("[")
+                index = 0
+                if reader.peek() != "]":
+                    while True:
+                        yield "analysis", index, parse_analysis(reader.value())
+                        index += 1
+                        if reader.peek() != ",":
+                            break
+                        reader.expect(",")
+                reader.expect("]")
+            else:
+                yield "field", key, reader.value()
+            if reader.peek() != ",":
+                break
+            reader.expect(",")
+    reader.expect("}")
+    # Como json.load, no se admite nada después del documento
+    if reader.peek() != "":
+        raise ValueError(f"Invalid JSON: extra data at offset {reader.pos}")
+
+
+# Leer un documento de resultados (.json) de forma incremental
+def load_document(stream):
+    fields = {}
+    analyses = []
+    for kind, key, value in iter_events(stream):
+        if kind == "analysis":
+            analyses.append(value)
+        else:
+            fields[key] = value
+    return _document(fields, analyses)
+
+
+# Leer un fichero JSONL con un documento de resultados por línea, uno cada vez. Con raw=True
+# devuelve (documento tal cual, Document), para los campos que no están en Document (file_name)
+def iter_documents(stream, raw=False):
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if line:
+            document = json.loads(line)
+            yield (document, parse_document(document)) if raw else parse_document(document)
@@ -1,87 +1,278 @@
+import time
+
+# Inicio de la ejecución del script, para medir lo que cuesta cada rerun
+_run_started = time.perf_counter()
+
 import streamlit as st
-import tempfile
+import hashlib
 import json
 import os
-from PyPDF2 import PdfReader
-import time
-import requests
-import fitz
-import io
-import pandas as pd
-from fastapi import FastAPI
-from pydantic import BaseModel
-
-# Función para inicializar claves en st.session_state
-def initialize_votes_state(analysis_idx, paragraph_idx):
-    key_vote = f"vote_{analysis_idx}_{paragraph_idx}"
-
-    if key_vote not in st.session_state:
-        st.session_state[key_vote] = None  # Ningún voto inicialmente
-
-    return key_vote
-
-# Transformar JSON
-def transform_json(input_json, annotator_name):
-    transformed_data = {
-        "paper_title": input_json.get("paper_title", "Not available"),
-        "DOI": input_json.get("DOI", "Not available"),
-        "annotator_name": annotator_name,  # Registrar el nombre del votante solo una vez
-        "generation_model": input_json.get("generation_model", "Not available"),
-        "similarity_model": input_json.get("similarity_model", "Not available"),
-        "similarity_metric": input_json.get("similarity_metric", "Not available"),
-        "rag_type":input_json.get("rag_type", "Not available"),
-        #"analysis": []
-        "result": []
+
+import backend
+import batch
+import cache
+import documents
+import export
+import jobs
+import ledger
+import metrics
+import records
+
+metrics.begin_run()
+
+# Imágenes estáticas incluidas con la aplicación
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+# Mostrar en la barra lateral el tiempo de ejecución de cada rerun
+SHOW_TIMINGS = os.environ.get("SOLAR_SHOW_TIMINGS", "0") == "1"
+
+# Segundos entre consultas del estado de un análisis en curso
+JOB_POLL_SECONDS = jobs.POLL_SECONDS
+
+# Minutos sin actividad tras los que se descartan los votos en memoria de la sesión (siguen
+# en el registro de votos y se recuperan al volver)
+SESSION_IDLE_SECONDS = float(os.environ.get("SOLAR_SESSION_IDLE_SECONDS", "1800"))
+
+# Desde Streamlit 1.52 el contenido de una descarga puede generarse al pulsar el botón
+DEFERRED_DOWNLOADS = tuple(int(part) for part in st.__version__.split(".")[:2]) >= (1, 52)
+
+# Tamaños de página de la vista de evidencias
+EVIDENCE_PAGE_SIZES = [10, 25, 50, 100]
+
+# Botones del modo de votación rápida y tecla asociada a cada uno
+QUICK_VOTE_LABELS = {"h": "← Back (h)", "j": "↑ Relevant (j)", "k": "↓ Not relevant (k)", "l": "Skip → (l)"}
+# El script de los atajos de teclado necesita st.iframe (acceso al documento de la app); sin
+# él los botones funcionan igual, pero sin atajos
+QUICK_VOTE_KEYS = hasattr(st, "iframe")
+QUICK_VOTE_SCRIPT = """
+<script>
+const doc = window.parent.document;
+const labels = __LABELS__;
+if (doc.solarQuickVoteHandler) {
+    doc.removeEventListener("keydown", doc.solarQuickVoteHandler);
+}
+doc.solarQuickVoteHandler = (event) => {
+    const target = event.target;
+    const tag = (target.tagName || "").toLowerCase();
+    if (tag === "input" || tag === "textarea" || target.isContentEditable || event.ctrlKey || event.metaKey || event.altKey) {
+        return;
+    }
+    const label = labels[event.key.toLowerCase()];
+    if (!label) {
+        return;
     }
+    const button = Array.from(doc.querySelectorAll("button")).find((b) => b.innerText.trim() === label);
+    if (button) {
+        event.preventDefault();
+        button.click();
+    }
+};
+doc.addEventListener("keydown", doc.solarQuickVoteHandler);
+</script>
+"""
+
+# Función de callback para actualizar el voto de una evidencia; el voto se guarda
+# también en el registro de votos (en segundo plano, sin esperar al disco)
+def update_vote(overlay, vote_id, value):
+    overlay["votes"][vote_id] = value
+    analysis_idx, evidence_idx = vote_id
+    ledger.record_vote(
+        overlay["digest"], overlay["paper_id"], overlay["categories"][analysis_idx], evidence_idx, overlay["annotator"], value
+    )
 
-    # Recorrer los resultados del análisis
-    for result in input_json.get("result", []):
-        question_category = result.get("question_category", "Unknown Category")
-        query = result.get("query", "Not available")
-        generation = result.get("generation", "Not available")
-        RAG_source = result.get("RAG_source", "Not available")
-        ground_truth = result.get("ground_truth", "Not available")
-        selected_answer_dict = result.get("selected_answer", {})
-        
-        #Manejo de claves en `selected_answer` para buscar la respuesta
-        selected_answer = "Not available"
-        for key, value in selected_answer_dict.items():
-            if question_category.replace(" ", "_").lower() in key.lower():
-                selected_answer = f"{key}: {value.strip()}"
-                break
-
-        evidences = result.get("evidences", [])
-
-        # Añadir la información procesada
-        analysis_entry = {
-            "question_category": question_category,
-            "query": query,
-            "generation": generation,
-            "RAG_source": RAG_source,
-            "ground_truth": ground_truth,
-            "selected_answer": selected_answer,
-            "evidences": []
+# Hash del contenido de un fichero subido, calculado una sola vez por subida
+def upload_digest(uploaded_file):
+    memo = st.session_state.setdefault("upload_digests", {})
+    if uploaded_file.file_id not in memo:
+        # Solo se recuerdan las subidas más recientes
+        while len(memo) >= 8:
+            memo.pop(next(iter(memo)))
+        memo[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+    return memo[uploaded_file.file_id]
+
+# Documento leído una sola vez por proceso y compartido por todas las sesiones (ver documents.py)
+def load_document(digest, uploaded_file):
+    loaded = documents.get(digest)
+    if loaded is None:
+        uploaded_file.seek(0)
+        with metrics.span("parse_json"):
+            loaded = documents.load(digest, uploaded_file, uploaded_file.size)
+    return loaded
+
+# Artículo al que pertenecen los votos en las exportaciones del registro de votos: el DOI o,
+# si no hay, el hash del fichero (los votos se guardan siempre por el hash del fichero)
+def paper_identifier(document, digest):
+    if document.DOI and document.DOI != records.NOT_AVAILABLE:
+        return document.DOI
+    return f"sha256:{digest}"
+
+# Clave de un widget o dato de la sesión que pertenece a un documento
+def document_key(digest, name):
+    return f"doc_{digest[:12]}_{name}"
+
+# Descartar todo lo que la sesión guarda del documento abierto: votos en memoria, posición,
+# widgets propios del documento y la exportación preparada
+def close_document():
+    overlay = st.session_state.pop("open_document", None)
+    if overlay is None:
+        return
+    documents.untrack_overlay(overlay)
+    prefix = document_key(overlay["digest"], "")
+    for key in [key for key in st.session_state if isinstance(key, str) and key.startswith(prefix)]:
+        del st.session_state[key]
+    st.session_state.pop("json_export_prepared", None)
+
+# Votos de la sesión para el documento abierto (solo los de ese documento). Al abrir otro
+# documento, cambiar de anotador o volver tras SESSION_IDLE_SECONDS sin actividad se
+# descartan los anteriores y se recuperan los guardados en el registro de votos.
+def open_document(digest, annotator_name, document):
+    overlay = st.session_state.get("open_document")
+    now = time.time()
+    if (
+        overlay is None
+        or overlay["digest"] != digest
+        or overlay["annotator"] != annotator_name
+        or now - overlay["touched"] > SESSION_IDLE_SECONDS
+    ):
+        close_document()
+        categories = [analysis.question_category for analysis in document.result]
+        category_index = {category: analysis_idx for analysis_idx, category in enumerate(categories)}
+        paper_id = paper_identifier(document, digest)
+        with metrics.span("load_votes"):
+            stored = ledger.load_votes(digest, annotator_name)
+        overlay = {
+            "digest": digest,
+            "annotator": annotator_name,
+            "paper_id": paper_id,
+            "categories": categories,
+            "votes": {
+                (category_index[category], evidence_idx): vote
+                for (category, evidence_idx), vote in stored.items()
+                if category in category_index
+            },
+            "cursor": 0,
         }
-
-        for evidence_idx, evidence in enumerate(evidences):
-            pdf_reference = evidence.get("pdf_reference", "Not available")
-            generated_facts = evidence.get("generated_facts", "Not available")
-            similarity_score = evidence.get("similarity_score", None)
-            
-            # Añadir evidencia al análisis con espacio para votos
-            evidence_entry = {
-                "pdf_reference": pdf_reference,
-                "generated_facts": generated_facts,
-                "similarity_score": similarity_score,
-            }
-
-            analysis_entry["evidences"].append(evidence_entry)
-
-        #transformed_data["analysis"].append(analysis_entry)
-        transformed_data["result"].append(analysis_entry)
-        
-
-    return transformed_data
+        st.session_state["open_document"] = overlay
+    overlay["touched"] = now
+    documents.track_overlay(overlay)
+    return overlay
+
+# Mostrar una evidencia con sus botones de voto
+def render_evidence(document, overlay, analysis_idx, evidence_idx):
+    pdf_reference = document.result[analysis_idx].evidences[evidence_idx].pdf_reference
+
+    votes = overlay["votes"]
+    vote_id = (analysis_idx, evidence_idx)
+    key_vote = document_key(overlay["digest"], f"vote_{analysis_idx}_{evidence_idx}")
+
+    col_pdf, col_votes = st.columns([3, 1])
+
+    with col_pdf:
+        # Mostrar el contenido del PDF
+        st.markdown(
+            f"<div style='border: 1px solid #ddd; padding: 10px; margin-bottom: 15px; border-radius: 5px;'>"
+            f"<p style='font-size:14px; line-height:1.6;'><strong>PDF Reference:</strong> {pdf_reference}</p>"
+            f"</div>",
+            unsafe_allow_html=True
+        )
+
+    with col_votes:
+        # Estado actual
+        current_vote = votes.get(vote_id)
+
+        # Botón UPVOTE: callback con actualización inmediata
+        if current_vote != "1":
+            st.button("↑", key=f"{key_vote}_up", on_click=update_vote, args=(overlay, vote_id, "1"))
+        else:
+            st.success("↑")
+
+        # Botón DOWNVOTE: callback con actualización inmediata
+        if current_vote != "0":
+            st.button("↓", key=f"{key_vote}_down", on_click=update_vote, args=(overlay, vote_id, "0"))
+        else:
+            st.error("↓")
+
+# Callback: ir a la página que contiene la primera evidencia de la categoría elegida
+def jump_to_category(digest, category_start):
+    analysis_idx = st.session_state[document_key(digest, "jump_category")]
+    st.session_state[document_key(digest, "evidence_page")] = category_start[analysis_idx] // st.session_state["page_size"] + 1
+
+# Vista paginada de evidencias
+def render_evidence_pages(document, overlay, items, category_start):
+    result = document.result
+    digest = overlay["digest"]
+    page_key = document_key(digest, "evidence_page")
+
+    col_size, col_category, col_page = st.columns(3)
+    with col_size:
+        page_size = st.selectbox("Evidences per page", EVIDENCE_PAGE_SIZES, key="page_size")
+    page_count = max(1, -(-len(items) // page_size))
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    with col_category:
+        st.selectbox(
+            "Jump to category", list(category_start), key=document_key(digest, "jump_category"),
+            format_func=lambda analysis_idx: result[analysis_idx].question_category.capitalize(),
+            on_change=jump_to_category, args=(digest, category_start)
+        )
+    with col_page:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    current_category = None
+    for analysis_idx, evidence_idx in items[start:start + page_size]:
+        # Encabezado cada vez que empieza una categoría en la página
+        if analysis_idx != current_category:
+            current_category = analysis_idx
+            st.markdown(f"#### {result[analysis_idx].question_category.capitalize()}")
+        render_evidence(document, overlay, analysis_idx, evidence_idx)
+
+# Callbacks del modo de votación rápida: votar y pasar a la siguiente evidencia, o moverse
+def vote_and_advance(overlay, vote_id, value, item_count):
+    update_vote(overlay, vote_id, value)
+    move_cursor(overlay, 1, item_count)
+
+def move_cursor(overlay, step, item_count):
+    overlay["cursor"] = min(max(overlay["cursor"] + step, 0), item_count - 1)
+
+# Modo de votación de una evidencia cada vez, con atajos de teclado (h, j, k, l)
+def render_quick_voting(document, overlay, items):
+    votes = overlay["votes"]
+    cursor = overlay["cursor"] = min(overlay["cursor"], len(items) - 1)
+    analysis_idx, evidence_idx = items[cursor]
+    analysis = document.result[analysis_idx]
+    evidence = analysis.evidences[evidence_idx]
+    vote_id = (analysis_idx, evidence_idx)
+
+    # El overlay solo contiene votos del documento abierto
+    voted = len(votes)
+    st.progress(voted / len(items), text=f"Evidence {cursor + 1} of {len(items)} · {voted} voted")
+    st.markdown(
+        f"<p style='font-size:14px;'><strong>{analysis.question_category.capitalize()}:</strong> "
+        f"<span style='font-weight:normal;'>{analysis.selected_answer}</span></p>"
+        f"<div style='border: 1px solid #ddd; padding: 10px; margin-bottom: 15px; border-radius: 5px;'>"
+        f"<p style='font-size:14px; line-height:1.6;'><strong>PDF Reference:</strong> {evidence.pdf_reference}</p>"
+        f"</div>",
+        unsafe_allow_html=True
+    )
+    current_vote = votes.get(vote_id)
+    if current_vote == "1":
+        st.success("Current vote: ↑")
+    elif current_vote == "0":
+        st.error("Current vote: ↓")
+
+    col_back, col_up, col_down, col_skip = st.columns(4)
+    with col_back:
+        st.button(QUICK_VOTE_LABELS["h"], key="quick_back", on_click=move_cursor, args=(overlay, -1, len(items)))
+    with col_up:
+        st.button(QUICK_VOTE_LABELS["j"], key="quick_up", on_click=vote_and_advance, args=(overlay, vote_id, "1", len(items)))
+    with col_down:
+        st.button(QUICK_VOTE_LABELS["k"], key="quick_down", on_click=vote_and_advance, args=(overlay, vote_id, "0", len(items)))
+    with col_skip:
+        st.button(QUICK_VOTE_LABELS["l"], key="quick_skip", on_click=move_cursor, args=(overlay, 1, len(items)))
+
+    # Los atajos de teclado pulsan los botones anteriores buscándolos por su texto
+    if QUICK_VOTE_KEYS:
+        st.iframe(QUICK_VOTE_SCRIPT.replace("__LABELS__", json.dumps(QUICK_VOTE_LABELS)), height="content")
 
 # Página JSON
 def json_page():
@@ -90,7 +281,7 @@ def json_page():
     col1, col2, col3 = st.columns([1, 13, 1])
     with col2:
         #st.image("/Users/alexandrafaje/Desktop/Solar/solar_chem/logo_pg.png", width=600)
-        st.image("https://github.com/oeg-upm/solar-qa-ui/web/images/logo_pg.png", width=600)
+        st.image(load_image("logo_pg.png"), width=600)
 
     # Agregar espacio antes del pie de página
     st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)   
@@ -101,10 +292,12 @@ def json_page():
     st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)   
 
     uploaded_json = st.file_uploader("Upload your JSON file please.", type="json")
+    if uploaded_json is None:
+        close_document()
 
     if uploaded_json is not None:
         try:
-            json_content = json.load(uploaded_json)
+            digest = upload_digest(uploaded_json)
 
             # Solicitar nombre del usuario
             st.markdown("### Please enter your name to continue:")
@@ -113,94 +306,61 @@ def json_page():
             if annotator_name:
                 st.success(f"Welcome, {annotator_name}! You can now cast your votes.")
 
-                transformed_json = transform_json(json_content, annotator_name)
+                # Documento compartido (solo lectura); los votos de la sesión van aparte
+                loaded = load_document(digest, uploaded_json)
+                document = loaded.document
+                overlay = open_document(digest, annotator_name, document)
+                votes = overlay["votes"]
 
                 # Información general del documento
                 with st.expander("Paper Information"):
                     st.markdown(f"""
                         <h4 style='color:#333;'>TITLE:</h4>
-                        <p style='font-size:16px; color:#555;'>{transformed_json['paper_title']}</p>
+                        <p style='font-size:16px; color:#555;'>{document.paper_title}</p>
                         <h4 style='color:#333;'>DOI:</h4>
-                        <p style='font-size:16px; color:#555;'>{transformed_json['DOI']}</p>
+                        <p style='font-size:16px; color:#555;'>{document.DOI}</p>
                         """, unsafe_allow_html=True)
 
-                #if "analysis" in transformed_json:
-                if "result" in transformed_json:    
+                if document.result:
 
                     st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)  
                     st.subheader("Answers found in the PDF")
                     st.write("Below are the answers our system found in the input PDF. You will see the answers divided in 5 tables: catalyst, co-catalyst, light_source, lamp, reaction_medium, reactor_type and operation_mode. Each answer has the five most relevant paragraphs the system found in the paper. Please vote for each paragraph (up or down) whether the target text has the right answer for the corresponding category.")
                     #st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)  
 
-                    for analysis_idx, analysis in enumerate(transformed_json["result"]):
+                    for analysis in document.result:
                         # Mostrar categoría y tipo directamente con formato
-                        category = analysis.get('question_category', 'Unknown Category').capitalize()
-                        selected_answer = analysis.get('selected_answer', 'Not available')
+                        category = analysis.question_category.capitalize()
+                        selected_answer = analysis.selected_answer
 
                         st.markdown(
                             f"<p style='font-size:14px;'><strong>{category}:</strong> <span style='font-weight:normal;'>{selected_answer}</span></p>",
                             unsafe_allow_html=True
                         )
 
-                        # Función de callback para actualizar el voto
-                        def update_vote(key_vote, value):
-                            st.session_state[key_vote] = value
-                            
-                        with st.expander("View Evidence Details"):
-                            for evidence_idx, evidence in enumerate(analysis.get("evidences", [])):
-                                pdf_reference = evidence.get("pdf_reference", "Not available")
-
-                                key_vote = f"vote_{analysis_idx}_{evidence_idx}"
-                                if key_vote not in st.session_state:
-                                    st.session_state[key_vote] = None
-
-                                col_pdf, col_votes = st.columns([3, 1])
-
-                                with col_pdf:
-                                    # Mostrar el contenido del PDF
-                                    st.markdown(
-                                        f"<div style='border: 1px solid #ddd; padding: 10px; margin-bottom: 15px; border-radius: 5px;'>"
-                                        f"<p style='font-size:14px; line-height:1.6;'><strong>PDF Reference:</strong> {pdf_reference}</p>"
-                                        f"</div>",
-                                        unsafe_allow_html=True
-                                    )
-
-                                with col_votes:
-                                    # Estado actual
-                                    current_vote = st.session_state[key_vote]
-
-                                    # Botón UPVOTE: callback con actualización inmediata
-                                    if current_vote != "1":
-                                        st.button("↑", key=f"upvote_{key_vote}", on_click=update_vote, args=(key_vote, "1"))
-                                    else:
-                                        st.success("↑")
-
-                                    # Botón DOWNVOTE: callback con actualización inmediata
-                                    if current_vote != "0":
-                                        st.button("↓", key=f"downvote_{key_vote}", on_click=update_vote, args=(key_vote, "0"))
-                                    else:
-                                        st.error("↓")
-
-                                # Guardar el voto
-                                current_vote = st.session_state[key_vote]
-
-                                # Asegurar que el voto es una cadena (0 o 1)
-                                if current_vote is not None:
-                                    current_vote = str(current_vote)  # Convertir a cadena para comparación
-
-                                if current_vote in ["0", "1"]:  # Solo añadir si es 0 o 1
-                                    evidence["vote"] = current_vote
-                                elif "vote" in evidence:  # Eliminar campo 'vote' si existe pero no es válido
-                                    del evidence["vote"]
-
-                    # Descargar JSON actualizado
-                    st.markdown("### Download Updated JSON")
-                    updated_json_data = json.dumps(transformed_json, indent=4)
-                    st.download_button(
-                        label="Download JSON",
-                        data=updated_json_data,
-                        file_name=f"{annotator_name}_updated.json",
-                        mime="application/json"
+                    # Solo se crean los widgets de las evidencias visibles
+                    items, category_start = loaded.items, loaded.category_start
+                    if not items:
+                        st.info("This file has no evidences to vote on.")
+                    else:
+                        st.markdown("<div style='height: 30px;'></div>", unsafe_allow_html=True)
+                        view = st.radio("Voting mode", ["Pages", "One by one (keyboard)"], horizontal=True, key="voting_mode")
+                        with metrics.span("render_evidences"):
+                            if view == "Pages":
+                                render_evidence_pages(document, overlay, items, category_start)
+                            else:
+                                render_quick_voting(document, overlay, items)
+
+                    st.markdown("### Download Highlighted PDF")
+                    render_highlighted_pdf(document.result, votes, key="json_highlight")
+
+                    # Descargar el documento con los votos (se genera solo cuando se pide)
+                    st.markdown("### Download Updated Results")
+                    render_export(
+                        lambda fmt: export.export_document(document, fmt, annotator_name, votes),
+                        (digest, annotator_name, dict(votes)),
+                        f"{annotator_name}_updated",
+                        key="json_export"
                     )
             else:
                 st.warning("Please enter your name to enable voting.")
@@ -226,21 +386,211 @@ def json_page():
     col1, col2, col3, col4 = st.columns([4, 2, 2, 2])
     with col2:
         #st.image("/Users/alexandrafaje/Desktop/Solar/solar_chem/logo_uni.png", width=150)
-        st.image("images/logo_uni.png", width=150)
+        st.image(load_image("logo_uni.png"), width=150)
         
         
         
 
+# Leer un JSON de configuración; la fecha de modificación forma parte de la clave de la
+# caché, así que el fichero solo se vuelve a leer cuando cambia. No debe modificarse.
+@st.cache_resource(show_spinner=False)
+def read_config_json(json_path, mtime):
+    with open(json_path, 'r') as f:
+        return json.load(f)
+
 # Cargamos el JSON automaticamente
 def load_json_automatically(json_path):
-    if os.path.exists(json_path):
-        with open(json_path, 'r') as f:
-            query_data = json.load(f)
-        #st.write("Archivo JSON cargado automáticamente.")
-        return query_data
-    else:
+    try:
+        mtime = os.path.getmtime(json_path)
+    except OSError:
         st.error(f"JSON file not found in path: {json_path}")
         return None
+    #st.write("Archivo JSON cargado automáticamente.")
+    return read_config_json(json_path, mtime)
+
+# Imagen estática leída una sola vez por proceso
+@st.cache_resource(show_spinner=False)
+def load_image(name):
+    with open(os.path.join(IMAGES_DIR, name), "rb") as f:
+        return f.read()
+
+# Leer un fichero exportado en disco
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+# Descarga bajo demanda: el fichero se genera solo al pulsar "Prepare download" y se ofrece
+# mientras signature (documento y votos) no cambie. build(formato) devuelve los bytes o, para
+# exportaciones grandes, la ruta del fichero escrito; entonces la sesión solo guarda la ruta.
+def render_export(build, signature, file_stem, key="export"):
+    col_format, col_prepare = st.columns([3, 1])
+    with col_format:
+        fmt = st.selectbox(
+            "Format", list(export.FORMATS), key=f"{key}_format",
+            format_func=lambda fmt: "JSON (complete document)" if fmt == "json" else f"{fmt.upper()} (one row per evidence)"
+        )
+    with col_prepare:
+        st.markdown("<div style='height: 28px;'></div>", unsafe_allow_html=True)
+        prepare = st.button("Prepare download", key=f"{key}_prepare")
+
+    if prepare:
+        try:
+            with st.spinner("Preparing the file..."):
+                with metrics.span("serialize", format=fmt):
+                    data = build(fmt)
+                st.session_state[f"{key}_prepared"] = {"format": fmt, "signature": signature, "data": data}
+        except ImportError:
+            st.error("Parquet export requires pyarrow (pip install pyarrow).")
+
+    prepared = st.session_state.get(f"{key}_prepared")
+    if prepared is not None and prepared["format"] == fmt and prepared["signature"] == signature:
+        extension, mime = export.FORMATS[fmt]
+        data = prepared["data"]
+        if not isinstance(data, str):
+            st.download_button(
+                label=f"Download {fmt.upper()}", data=data, file_name=f"{file_stem}.{extension}", mime=mime, key=f"{key}_download"
+            )
+        elif DEFERRED_DOWNLOADS:
+            # El fichero se lee solo cuando se pulsa el botón
+            st.download_button(
+                label=f"Download {fmt.upper()}", data=lambda: read_file(data), file_name=f"{file_stem}.{extension}",
+                mime=mime, key=f"{key}_download"
+            )
+        else:
+            with open(data, "rb") as f:
+                st.download_button(
+                    label=f"Download {fmt.upper()}", data=f, file_name=f"{file_stem}.{extension}", mime=mime, key=f"{key}_download"
+                )
+
+# Generar y descargar el PDF con las evidencias resaltadas (color por categoría y voto).
+# analyses es una lista de records.Analysis. Si no se indica el PDF original se pide al usuario.
+def render_highlighted_pdf(analyses, votes, pdf_file=None, key="highlight"):
+    if pdf_file is None:
+        pdf_file = st.file_uploader("Upload the original PDF to get a highlighted version", type=["pdf"], key=f"{key}_pdf")
+        if pdf_file is None:
+            return
+
+    import highlight
+
+    evidences = [
+        {
+            "category": analysis.question_category,
+            "pdf_reference": evidence.pdf_reference,
+            "vote": votes.get((analysis_idx, evidence_idx)),
+        }
+        for analysis_idx, analysis in enumerate(analyses)
+        for evidence_idx, evidence in enumerate(analysis.evidences)
+    ]
+    digest = upload_digest(pdf_file)
+
+    if st.button("Generate highlighted PDF", key=f"{key}_generate"):
+        with st.spinner("Highlighting the evidences in the PDF..."):
+            with metrics.span("highlight_pdf"):
+                highlight.highlight_pdf(pdf_file.getvalue(), evidences, digest)
+
+    # Solo se ofrece la descarga si el PDF generado corresponde a los votos actuales
+    output = highlight.cached_highlight(digest, evidences)
+    if output is not None:
+        data, found, missing = output
+        st.caption(f"{found} of {len(evidences)} evidences were found in the PDF.")
+        st.download_button(
+            label="Download highlighted PDF",
+            data=data,
+            file_name=f"{os.path.splitext(pdf_file.name)[0]}_highlighted.pdf",
+            mime="application/pdf",
+            key=f"{key}_download"
+        )
+
+# Mostrar el resultado de un análisis (categorías, respuestas y evidencias).
+# Con complete=False se muestran las categorías recibidas hasta el momento, sin descarga.
+def render_analysis(temp, complete=True, pdf_file=None, job_id=None):
+    result = temp.get("result", [])
+    generation_model = temp.get("generation_model", "Not available")
+
+    # Información general del documento
+    with st.expander("Paper Information"):
+        st.markdown(f"""
+            <h4 style='color:#333;'>TITLE:</h4>
+            <p style='font-size:16px; color:#555;'>{temp.get("paper_title", "No disponible")}</p>
+            <h4 style='color:#333;'>DOI:</h4>
+            <p style='font-size:16px; color:#555;'>{temp.get("DOI", "No disponible")}</p>
+            """, unsafe_allow_html=True)
+
+    st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
+    st.subheader("Answers found in the PDF")
+    st.write("Below are the answers our system found in the input PDF. You will see the answers divided in 5 tables: catalyst, co-catalyst, light_source, lamp, reaction_medium, reactor_type and operation_mode. Each answer has the five most relevant paragraphs the system found in the paper. Please vote for each paragraph (up or down) whether the target text has the right answer for the corresponding category.")
+    st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
+
+    # Mostrar resultados por categoría con evidencia y votación
+    for analysis_idx, analysis in enumerate(result):
+        category = analysis.get('question_category', 'Unknown Category').capitalize()
+        selected_answer = analysis.get('selected_answer', {}).get(category.lower(), 'Not available')
+
+
+        st.markdown(
+            f"<p style='font-size:14px;'><strong>{category}:</strong> "
+            f"<span style='font-weight:normal;'>{selected_answer}</span></p>",
+            unsafe_allow_html=True
+        )
+
+        with st.expander("View Evidence Details"):
+            for evidence_idx, evidence in enumerate(analysis.get("evidences", [])):
+                pdf_reference = evidence.get("pdf_reference", "Not available")
+
+                st.markdown(
+                    f"<div style='border: 1px solid #ddd; padding: 10px; margin-bottom: 15px; "
+                    f"border-radius: 5px;'>"
+                    f"<p style='font-size:14px; line-height:1.6;'>"
+                    f"<strong>PDF Reference:</strong> {pdf_reference}</p>"
+                    f"</div>",
+                    unsafe_allow_html=True
+                 )
+
+    if not complete:
+        return
+
+    # Descargar el resultado (se genera solo cuando se pide); el JSON es el del backend tal cual
+    with metrics.span("transform"):
+        document = records.parse_document(temp)
+    st.markdown("### Download Results")
+    render_export(
+        lambda fmt: export.export_document(document, fmt, nested=temp),
+        job_id, "analysis_updated", key="home_export"
+    )
+
+    st.markdown("### Download Highlighted PDF")
+    render_highlighted_pdf(document.result, {}, pdf_file, key="home_highlight")
+
+
+# Progreso de un trabajo en curso. Solo este fragmento se vuelve a ejecutar cada
+# JOB_POLL_SECONDS; cuando el trabajo termina se vuelve a ejecutar la página entera
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job_id):
+    with metrics.span("load_job"):
+        job = jobs.get_job(job_id)
+    if job is None or job["status"] not in (jobs.PENDING, jobs.RUNNING):
+        st.rerun()
+
+    st.info("Analyzing your paper. Please be patient... You can safely reload this page.")
+    if job["result"]:
+        with metrics.span("render_results"):
+            render_analysis(job["result"], complete=False)
+
+# Consultar el estado de un trabajo y mostrarlo
+def show_job(job_id, pdf_file=None):
+    with metrics.span("load_job"):
+        job = jobs.get_job(job_id)
+    if job is None:
+        st.warning("The requested analysis was not found. Please submit your paper again.")
+        return
+
+    if job["status"] in (jobs.PENDING, jobs.RUNNING):
+        show_job_progress(job_id)
+    elif job["status"] == jobs.FAILED:
+        st.error(job["error"])
+    else:
+        with metrics.span("render_results"):
+            render_analysis(job["result"], pdf_file=pdf_file, job_id=job_id)
 
 # Pagina principal
 def main_page():
@@ -251,7 +601,7 @@ def main_page():
     col1, col2, col3 = st.columns([1, 13, 1])
     with col2:
         #st.image("/Users/alexandrafaje/Desktop/Solar/solar_chem/logo_pg.png", width=600)
-        st.image("https://github.com/oeg-upm/solar-qa-ui/web/images/logo_pg.png", width=600)
+        st.image(load_image("logo_pg.png"), width=600)
 
     # Agregar espacio
     st.markdown("<div style='height: 80px;'></div>", unsafe_allow_html=True)
@@ -263,97 +613,42 @@ def main_page():
     # Subir archivo PDF
     uploaded_pdf = st.file_uploader("Upload your scientific paper please", type=["pdf"])
     doi = st.text_input("DOI (Optional):")
+    refresh = st.checkbox("Run the analysis again even if this paper was already analyzed", value=False)
 
-    # Botón para enviar el archivo
-    if uploaded_pdf and st.button("Submit"):
-        with st.spinner("Analyzing your paper. Please be patient..."):
-            try:
-                args_dict = {
-                    "llm_id": "llama3.1",
-                    "embedding_id": "nomic-embed-text",
-                    "input_file_path": uploaded_pdf.name,
-                    #"input_file_path": "/Users/alexandrafaje/Desktop/Solar/solar_chem/new_paper_1.pdf",
-                    "prompt_file": "prompts.json",
-                    "context_file_path": "context.json",
-                    "rag_type": "fact"
-                }
-
-                # Llamada al backend
-                response = requests.post("http://127.0.0.1:8000/analysis/", json=args_dict)
-
-                # Validar respuesta
-                if response.status_code == 200:
-                    temp = response.json()
-
-                    if doi:
-                        temp["DOI"] = doi
-
-                    result = temp.get("result", [])
-                    generation_model = temp.get("generation_model", "Not available")
-
-                    # Información general del documento
-                    with st.expander("Paper Information"):
-                        st.markdown(f"""
-                            <h4 style='color:#333;'>TITLE:</h4>
-                            <p style='font-size:16px; color:#555;'>{temp.get("paper_title", "No disponible")}</p>
-                            <h4 style='color:#333;'>DOI:</h4>
-                            <p style='font-size:16px; color:#555;'>{temp.get("DOI", "No disponible")}</p>
-                            """, unsafe_allow_html=True)
-
-                    st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
-                    st.subheader("Answers found in the PDF")
-                    st.write("Below are the answers our system found in the input PDF. You will see the answers divided in 5 tables: catalyst, co-catalyst, light_source, lamp, reaction_medium, reactor_type and operation_mode. Each answer has the five most relevant paragraphs the system found in the paper. Please vote for each paragraph (up or down) whether the target text has the right answer for the corresponding category.")
-                    st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
-
-                    # Mostrar resultados por categoría con evidencia y votación
-                    for analysis_idx, analysis in enumerate(result):
-                        category = analysis.get('question_category', 'Unknown Category').capitalize()
-                        selected_answer = analysis.get('selected_answer', {}).get(category.lower(), 'Not available')
-
-
-                        st.markdown(
-                            f"<p style='font-size:14px;'><strong>{category}:</strong> "
-                            f"<span style='font-weight:normal;'>{selected_answer}</span></p>",
-                            unsafe_allow_html=True
-                        )
-
-                        with st.expander("View Evidence Details"):
-                            for evidence_idx, evidence in enumerate(analysis.get("evidences", [])):
-                                pdf_reference = evidence.get("pdf_reference", "Not available")
-
-                                st.markdown(
-                                    f"<div style='border: 1px solid #ddd; padding: 10px; margin-bottom: 15px; "
-                                    f"border-radius: 5px;'>"
-                                    f"<p style='font-size:14px; line-height:1.6;'>"
-                                    f"<strong>PDF Reference:</strong> {pdf_reference}</p>"
-                                    f"</div>",
-                                    unsafe_allow_html=True
-                                 )
-
-                    # Descargar JSON actualizado
-                    st.markdown("### Download Updated JSON")
-                    updated_json_data = json.dumps(temp, indent=4)
-                    st.download_button(
-                        label="Download JSON",
-                        data=updated_json_data,
-                        file_name=f"analysis_updated.json",
-                        mime="application/json"
-                    )
-
-                else:
-                    st.error(f"Error en el servidor: {response.status_code}")
-                    if response.text:
-                        st.error(f"Detalles: {response.text}")
-
-            except requests.exceptions.ConnectionError:
-                st.error("Error: No se pudo conectar al servidor. Verifica que el backend está activo.")
-            except json.JSONDecodeError:
-                st.error("Error: El servidor devolvió una respuesta no válida.")
-            except Exception as e:
-                st.error(f"Error inesperado: {e}")
-
-
+    if uploaded_pdf and uploaded_pdf.size > backend.MAX_UPLOAD_BYTES:
+        st.error(f"The PDF is too large. The maximum size is {backend.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+        uploaded_pdf = None
 
+    # Botón para enviar el archivo: el análisis se lanza como trabajo en segundo plano
+    if uploaded_pdf and st.button("Submit"):
+        args_dict = backend.default_args(uploaded_pdf.name)
+        overrides = {"DOI": doi} if doi else None
+
+        # Reutilizar un análisis anterior del mismo PDF con la misma configuración
+        pdf_buffer = uploaded_pdf.getbuffer()
+        pdf_sha256 = cache.pdf_digest(pdf_buffer)
+        key = cache.cache_key(pdf_sha256, args_dict, json_path)
+        cached_result = None if refresh else cache.get(key)
+        if cached_result is not None:
+            job_id = jobs.store_job(args_dict, key, overrides)
+        else:
+            # El PDF se envía al backend en trozos directamente desde el buffer de la subida
+            task = backend.with_upload(backend.stream_analysis, pdf_buffer, pdf_sha256, uploaded_pdf.name)
+            job_id = jobs.submit_job(args_dict, cache.cached(task, key), overrides=overrides)
+        st.session_state["job_id"] = job_id
+        # Guardar el id en la URL para poder retomar el trabajo tras recargar el navegador
+        st.query_params["job"] = job_id
+
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    if job_id:
+        show_job(job_id, uploaded_pdf)
+
+    # Estadísticas de la caché de análisis
+    cache_stats = cache.stats()
+    st.caption(
+        f"Analysis cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%} hit rate)"
+    )
 
     # Agregar espacio antes del pie de página
     st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
@@ -372,7 +667,88 @@ def main_page():
     col1, col2, col3, col4 = st.columns([4, 2, 2, 2])
     with col2:
         #st.image("/Users/alexandrafaje/Desktop/Solar/solar_chem/logo_uni.png", width=150)
-        st.image("images/logo_uni.png", width=150)
+        st.image(load_image("logo_uni.png"), width=150)
+
+# Resultados de un lote en el formato pedido. La conversión se hace documento a documento
+# sobre el fichero del lote, sin cargar todos los resultados en memoria; devuelve la ruta
+# del fichero convertido.
+def export_batch(run, fmt):
+    path = f"{os.path.splitext(run.output_path)[0]}_export.{export.FORMATS[fmt][0]}"
+    export.export_jsonl(run.output_path, path, fmt)
+    return path
+
+# Mostrar el progreso de un lote y el estado de cada artículo
+def render_batch_status(run):
+    progress = run.progress()
+    st.progress(
+        progress["completed"] / progress["total"] if progress["total"] else 1.0,
+        text=f"{progress['completed']} of {progress['total']} papers analyzed"
+    )
+    col_rate, col_eta, col_failed = st.columns(3)
+    col_rate.metric("Papers per hour", f"{progress['papers_per_hour']:.1f}")
+    col_eta.metric("Time remaining" if not progress["finished"] else "Total time",
+                   batch.format_seconds(progress["eta"] if not progress["finished"] else progress["elapsed"]))
+    col_failed.metric("Failed", progress["failed"])
+    if progress["duplicate"]:
+        st.caption(f"{progress['duplicate']} duplicated files were skipped.")
+
+    st.dataframe(
+        [
+            {
+                "Paper": paper.name,
+                "DOI": paper.doi or "",
+                "Status": paper.status,
+                "Seconds": round(paper.seconds, 1) if paper.seconds is not None else None,
+                "Error": paper.error or "",
+            }
+            for paper in run.papers
+        ],
+        use_container_width=True
+    )
+
+# Progreso de un lote en curso, actualizado cada JOB_POLL_SECONDS sin volver a ejecutar la
+# página entera; cuando el lote termina se vuelve a ejecutar la página para ofrecer la descarga
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_batch_progress(run):
+    if run.finished:
+        st.rerun()
+    render_batch_status(run)
+
+def show_batch(run):
+    if run.finished:
+        render_batch_status(run)
+        render_export(lambda fmt: export_batch(run, fmt), run.id, "batch_results", key="batch_export")
+    else:
+        show_batch_progress(run)
+
+# Página de análisis por lotes
+def batch_page():
+    st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
+    st.markdown("<h2 style='text-align: center;'>BATCH ANALYSIS</h2>", unsafe_allow_html=True)
+    st.write("Upload many PDFs, or a ZIP file with PDFs, and optionally a CSV file with two columns (file name and DOI). Repeated files are analyzed only once and all the results are written to a single JSONL file.")
+
+    uploaded_files = st.file_uploader("Upload your papers (PDF or ZIP)", type=["pdf", "zip"], accept_multiple_files=True)
+    uploaded_dois = st.file_uploader("DOI list (Optional, CSV)", type=["csv"])
+    concurrency = st.number_input("Papers analyzed at the same time", min_value=1, max_value=32, value=batch.CONCURRENCY)
+
+    if uploaded_files and st.button("Start batch"):
+        papers = []
+        for uploaded_file in uploaded_files:
+            if uploaded_file.name.lower().endswith(".zip"):
+                papers.extend(batch.papers_from_zip(uploaded_file))
+            else:
+                papers.append(batch.paper_from_buffer(uploaded_file.name, uploaded_file))
+        dois = batch.read_dois(uploaded_dois) if uploaded_dois else None
+        run = batch.start_batch(papers, dois, concurrency=int(concurrency), prompt_path="prompts.json")
+        st.session_state["batch_id"] = run.id
+
+    batch_id = st.session_state.get("batch_id")
+    if batch_id:
+        run = batch.get_batch(batch_id)
+        if run is None:
+            st.warning("The batch was not found. It may have expired or been lost after a server restart; its results are still in the batch output directory.")
+        else:
+            show_batch(run)
 
 # About page
 def about_page():
@@ -383,7 +759,7 @@ def about_page():
     col1, col2, col3 = st.columns([1, 13, 1])
     with col2:
         #st.image("/Users/alexandrafaje/Desktop/Solar/solar_chem/logo_pg.png", width=600)
-        st.image("https://github.com/oeg-upm/solar-qa-ui/web/images/logo_pg.png", width=600)
+        st.image(load_image("logo_pg.png"), width=600)
     
     st.markdown("<h2 style='text-align: center;'>ABOUT</h2>", unsafe_allow_html=True)
     st.markdown("---")
@@ -431,23 +807,77 @@ def about_page():
     col1, col2, col3, col4 = st.columns([4, 2, 2, 2])
     with col2:
         #st.image("/Users/alexandrafaje/Desktop/Solar/solar_chem/logo_uni.png", width=150)
-        st.image("images/logo_uni.png", width=150)
-
+        st.image(load_image("logo_uni.png"), width=150)
+
+
+# Registrar los indicadores del proceso y arrancar los exportadores de métricas, una vez por proceso
+@st.cache_resource(show_spinner=False)
+def start_metrics():
+    metrics.register_gauge("solar_analysis_cache_hits_total", lambda: cache.stats()["hits"], "Analysis cache hits", "counter")
+    metrics.register_gauge("solar_analysis_cache_misses_total", lambda: cache.stats()["misses"], "Analysis cache misses", "counter")
+    metrics.register_gauge("solar_analysis_cache_evictions_total", lambda: cache.stats()["evictions"], "Analysis cache evictions", "counter")
+    metrics.register_gauge("solar_analysis_cache_hit_ratio", lambda: cache.stats()["hit_rate"], "Analysis cache hit ratio")
+    metrics.register_gauge("solar_document_cache_entries", lambda: documents.stats()["entries"], "Result documents kept in memory")
+    metrics.register_gauge("solar_document_cache_bytes", lambda: documents.stats()["bytes"], "Size of the result documents kept in memory")
+    metrics.register_gauge("solar_document_cache_hits_total", lambda: documents.stats()["hits"], "Result document cache hits", "counter")
+    metrics.register_gauge("solar_document_cache_evictions_total", lambda: documents.stats()["evictions"], "Result document cache evictions", "counter")
+    metrics.register_gauge("solar_backend_circuit_open", lambda: 0 if backend.breaker.state == "closed" else 1, "1 while the backend circuit breaker is open or half-open")
+    metrics.start()
+
+# Panel de desarrollo en la barra lateral: duración del rerun y, con métricas activadas,
+# tiempo de cada etapa, latencia del backend y estado de la caché
+def render_timings(total, spans):
+    st.sidebar.caption(f"Script run: {total * 1000:.1f} ms")
+    if not metrics.ENABLED:
+        st.sidebar.caption("Set SOLAR_METRICS=1 for a per-stage breakdown.")
+        return
+
+    with st.sidebar.expander("Performance", expanded=True):
+        stages = {}
+        for stage, seconds in spans:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        if stages:
+            st.table([{"Stage": stage, "ms": round(seconds * 1000, 1)} for stage, seconds in stages.items()])
+        for row in metrics.histogram_summary("solar_backend_request_seconds"):
+            labels = row["labels"]
+            st.caption(
+                f"{labels['method']} {labels['endpoint']} ({labels['status']}): {row['count']} calls, "
+                f"mean {row['mean'] * 1000:.0f} ms, p95 ≤ {row['p95'] * 1000:.0f} ms"
+            )
+        cache_stats = cache.stats()
+        st.caption(
+            f"Analysis cache: {cache_stats['hit_rate']:.0%} hit rate · "
+            f"Active sessions: {metrics.active_sessions()}"
+        )
 
 # Función principal para gestionar las páginas
 def main():
+    if metrics.ENABLED:
+        start_metrics()
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            metrics.touch_session(ctx.session_id)
+
+    # Vaciar los votos en memoria de las sesiones inactivas, también de las que ya no se usan
+    documents.release_idle_overlays(SESSION_IDLE_SECONDS)
+
     if "page" not in st.session_state:
         st.session_state.page = "Home"
 
     # Barra de navegación con botones en línea
-    col1, col2, col3, col4 = st.columns([5, 1, 1, 1])
+    col1, col2, col3, col4, col5 = st.columns([4, 1, 1, 1, 1])
     with col2:
         if st.button("Home", key="home_button"):
             st.session_state.page = "Home"
     with col3:
+        if st.button("Batch", key="batch_button"):
+            st.session_state.page = "Batch"
+    with col4:
         if st.button("JSON", key="json_button"):
             st.session_state.page = "Json"
-    with col4:
+    with col5:
         if st.button("About", key="about_button"):
             st.session_state.page = "About"
 
@@ -458,6 +888,12 @@ def main():
         about_page()
     elif st.session_state.page == "Json":
         json_page()
+    elif st.session_state.page == "Batch":
+        batch_page()
+
+    spans = metrics.end_run(time.perf_counter() - _run_started, page=st.session_state.page)
+    if SHOW_TIMINGS:
+        render_timings(time.perf_counter() - _run_started, spans)
 
 if __name__ == "__main__":
     main()
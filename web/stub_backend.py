@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+import recording
+
+# Backend de pruebas que imita /analysis/ sin GROBID ni modelos. Se configura con:
+#   SOLAR_STUB_LATENCY       segundos que tarda cada análisis (repartidos entre las categorías)
+#   SOLAR_STUB_FAILURE_RATE  proporción de peticiones que fallan con 503
+#   SOLAR_STUB_EVIDENCES     evidencias por categoría
+#   SOLAR_STUB_REPLAY        fichero grabado con SOLAR_RECORD_FILE: se devuelven las respuestas
+#                            grabadas en lugar de las sintéticas
+#   SOLAR_REPLAY_LATENCY_SCALE  factor por el que se multiplican las latencias grabadas
+#                            (1 = las grabadas, 0.5 = la mitad, 0 = sin espera)
+# Uso: uvicorn stub_backend:app --port 8000, o run_in_thread() desde un test o benchmark.
+
+CATEGORIES = ["catalyst", "co_catalyst", "light_source", "lamp", "reaction_medium", "reactor_type", "operation_mode"]
+
+settings = {
+    "latency": float(os.environ.get("SOLAR_STUB_LATENCY", "0.5")),
+    "failure_rate": float(os.environ.get("SOLAR_STUB_FAILURE_RATE", "0")),
+    "evidences": int(os.environ.get("SOLAR_STUB_EVIDENCES", "5")),
+    "replay": os.environ.get("SOLAR_STUB_REPLAY", ""),
+    "replay_latency_scale": float(os.environ.get("SOLAR_REPLAY_LATENCY_SCALE", "1")),
+}
+uploads = {}
+_replayers = {}
+
+app = FastAPI(title="SolarChem stub backend")
+
+
+# Resultado de análisis sintético con la misma estructura que el backend real
+def sample_result(args_dict, evidences_per_category=5):
+    paper = os.path.basename(args_dict.get("input_file_path", "paper.pdf"))
+    result = []
+    for category in CATEGORIES:
+        result.append({
+            "question_category": category,
+            "query": f"What is the {category.replace('_', ' ')} used in the paper?",
+            "generation": f"The {category.replace('_', ' ')} reported in {paper}.",
+            "RAG_source": "fact",
+            "ground_truth": "Not available",
+            "selected_answer": {category: f"sample {category}"},
+            "evidences": [
+                {
+                    "pdf_reference": f"Paragraph {idx} of {paper} describing the {category.replace('_', ' ')} of the photocatalytic reaction.",
+                    "generated_facts": f"Fact {idx} about the {category.replace('_', ' ')}.",
+                    "similarity_score": round(1 - idx / (evidences_per_category + 1), 3),
+                }
+                for idx in range(evidences_per_category)
+            ],
+        })
+    return {
+        "paper_title": f"Stub analysis of {paper}",
+        "DOI": "Not available",
+        "generation_model": args_dict.get("llm_id", "stub"),
+        "similarity_model": args_dict.get("embedding_id", "stub"),
+        "similarity_metric": "cosine",
+        "rag_type": args_dict.get("rag_type", "fact"),
+        "result": result,
+    }
+
+
+def _maybe_fail():
+    if random.random() < settings["failure_rate"]:
+        raise HTTPException(status_code=503, detail="Stub backend failure")
+
+
+# Grabación que corresponde a la petición, o None si no se está reproduciendo una grabación
+def _replayed(args_dict):
+    path = settings["replay"]
+    if not path:
+        return None
+    if path not in _replayers:
+        _replayers[path] = recording.Replayer.from_file(path)
+    return _replayers[path].lookup(args_dict)
+
+
+# Reproducir una llamada que falló al grabarse
+async def _replay_failure(entry):
+    if entry.get("error"):
+        await asyncio.sleep(entry.get("seconds", 0) * settings["replay_latency_scale"])
+        raise HTTPException(status_code=entry.get("status") or 502, detail=entry["error"])
+
+
+@app.post("/analysis/")
+async def analysis(request: Request):
+    args_dict = await request.json()
+    entry = _replayed(args_dict)
+    if entry is not None:
+        await _replay_failure(entry)
+        await asyncio.sleep(entry.get("seconds", 0) * settings["replay_latency_scale"])
+        return entry["response"]
+    _maybe_fail()
+    await asyncio.sleep(settings["latency"])
+    return sample_result(args_dict, settings["evidences"])
+
+
+@app.post("/analysis/stream/")
+async def analysis_stream(request: Request):
+    args_dict = await request.json()
+    entry = _replayed(args_dict)
+    if entry is not None:
+        await _replay_failure(entry)
+        temp = dict(entry["response"])
+        offsets = recording.category_offsets(entry, settings["replay_latency_scale"])
+    else:
+        _maybe_fail()
+        temp = sample_result(args_dict, settings["evidences"])
+        step = settings["latency"] / len(temp["result"])
+        offsets = [step * (idx + 1) for idx in range(len(temp["result"]))]
+    categories = temp.pop("result", [])
+
+    # Cada categoría se envía en el momento indicado (segundos desde el inicio de la respuesta)
+    async def lines():
+        started = time.monotonic()
+        yield json.dumps(temp) + "\n"
+        for category, offset in zip(categories, offsets):
+            await asyncio.sleep(max(0.0, offset - (time.monotonic() - started)))
+            yield json.dumps(category) + "\n"
+        yield json.dumps({"done": True, "categories": len(categories)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.head("/uploads/{digest}")
+async def upload_exists(digest: str):
+    return Response(status_code=200 if digest in uploads else 404)
+
+
+@app.put("/uploads/{digest}")
+async def upload(digest: str, request: Request):
+    checksum = hashlib.sha256()
+    size = 0
+    async for chunk in request.stream():
+        checksum.update(chunk)
+        size += len(chunk)
+    if checksum.hexdigest() != digest:
+        raise HTTPException(status_code=400, detail="Checksum mismatch")
+    uploads[digest] = {"size": size, "file_name": request.headers.get("X-File-Name")}
+    return Response(status_code=201)
+
+
+# Arrancar el backend de pruebas en un hilo del proceso actual; devuelve (url, servidor).
+# Con replay se reproducen las respuestas de esa grabación. Para pararlo: servidor.should_exit = True
+def run_in_thread(host="127.0.0.1", port=8765, replay=None, replay_latency_scale=None):
+    if replay is not None:
+        settings["replay"] = replay
+    if replay_latency_scale is not None:
+        settings["replay_latency_scale"] = replay_latency_scale
+
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="solar-stub-backend", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"The stub backend could not start on {host}:{port}")
+        time.sleep(0.01)
+    return f"http://{host}:{port}", server